@@ -1,13 +1,27 @@
 import os
+import csv
+import hashlib
+import io
 import json
+import queue
+import re
+import socket
 import requests
+import struct
+import threading
+import time
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session
+from flask import Flask, Response, request, jsonify, make_response, render_template, redirect, url_for, session, stream_with_context
 from flask_restful import Resource, Api
-from pymongo import MongoClient, errors
+from pymongo import ASCENDING, DESCENDING, TEXT, MongoClient, ReturnDocument, UpdateMany, UpdateOne, errors
 from bson.objectid import ObjectId
-from google import genai
+import assets
+import metrics
 
 # Load environment variables
 load_dotenv("config.env")
@@ -15,62 +29,833 @@ load_dotenv("config.env")
 class Config:
     MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/EarnAndEat")
     DEBUG = os.environ.get("DEBUG", "False") == "True"
+    # Multi-document transactions need a replica set or mongos.
+    MONGO_TRANSACTIONS = os.environ.get("MONGO_TRANSACTIONS", "False") == "True"
+    # Other workers only see NGO sign-ups once their cached chat context expires.
+    NGO_CONTEXT_TTL = int(os.environ.get("NGO_CONTEXT_TTL", "300"))
+    # "fake" swaps Gemini for a local client that streams canned tokens.
+    GEMINI_CLIENT = os.environ.get("GEMINI_CLIENT", "google")
+    GEMINI_FAKE_TOKEN_DELAY = float(os.environ.get("GEMINI_FAKE_TOKEN_DELAY", "0.05"))
+    # Each chat request waiting on Gemini holds a request thread, so keep
+    # GEMINI_MAX_CONCURRENCY + GEMINI_MAX_QUEUE well below the request threads
+    # per worker (gunicorn --threads) to leave the rest for pages. Chats beyond
+    # that, or queued longer than GEMINI_QUEUE_WAIT seconds, get a 503 at once.
+    GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "4"))
+    GEMINI_MAX_QUEUE = int(os.environ.get("GEMINI_MAX_QUEUE", "4"))
+    GEMINI_QUEUE_WAIT = float(os.environ.get("GEMINI_QUEUE_WAIT", "2"))
+    GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", "30"))
+    CHAT_CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", "512"))
+    CHAT_CACHE_TTL = int(os.environ.get("CHAT_CACHE_TTL", "600"))
+    # Seconds between donation folds (0 disables the in-process folder) and how
+    # old a donation must be before it is folded into amount_raised.
+    DONATION_FOLD_INTERVAL = float(os.environ.get("DONATION_FOLD_INTERVAL", "5"))
+    DONATION_FOLD_LAG = float(os.environ.get("DONATION_FOLD_LAG", "2"))
+    # Quotas shown on the redemption form may lag other workers by this much.
+    PROVIDER_CACHE_TTL = int(os.environ.get("PROVIDER_CACHE_TTL", "60"))
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "True") == "True"
+    # Adds a Server-Timing header (handler and Mongo time) to every response.
+    METRICS_SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "False") == "True"
+    MONGO_SLOW_MS = float(os.environ.get("MONGO_SLOW_MS", "100"))
+    # Seconds between analytics rollups (0 disables the in-process job) and how
+    # old a transaction must be before it is rolled up.
+    ANALYTICS_ROLLUP_INTERVAL = float(os.environ.get("ANALYTICS_ROLLUP_INTERVAL", "60"))
+    ANALYTICS_ROLLUP_LAG = float(os.environ.get("ANALYTICS_ROLLUP_LAG", "5"))
+    # Seconds a process holds the rollup job after its last batch; another
+    # process can take over once it lapses.
+    ANALYTICS_ROLLUP_LEASE = float(os.environ.get("ANALYTICS_ROLLUP_LEASE", "120"))
+    # How old a ledger entry must be before it is folded into a balance
+    # snapshot, so writes still in flight are not skipped over.
+    LEDGER_SNAPSHOT_LAG = float(os.environ.get("LEDGER_SNAPSHOT_LAG", "5"))
+    # Rendered pages kept per worker, and how long a page version is trusted
+    # before writes that bump no version (background jobs) are picked up.
+    VIEW_CACHE_SIZE = int(os.environ.get("VIEW_CACHE_SIZE", "1024"))
+    VIEW_VERSION_TTL = int(os.environ.get("VIEW_VERSION_TTL", "30"))
+    # Live dashboard updates need change streams (a replica set or mongos).
+    # LIVE_REPLAY_SIZE recent changes are kept per worker for reconnecting
+    # browsers; a browser more than LIVE_QUEUE_SIZE changes behind reloads.
+    LIVE_UPDATES = os.environ.get("LIVE_UPDATES", "True") == "True"
+    LIVE_REPLAY_SIZE = int(os.environ.get("LIVE_REPLAY_SIZE", "1000"))
+    LIVE_QUEUE_SIZE = int(os.environ.get("LIVE_QUEUE_SIZE", "100"))
+    LIVE_KEEPALIVE = float(os.environ.get("LIVE_KEEPALIVE", "15"))
+    # A worker whose last dashboard left less than LIVE_RESUME_SECONDS ago
+    # resumes its change stream where it stopped, so reconnects replay cleanly.
+    LIVE_RESUME_SECONDS = float(os.environ.get("LIVE_RESUME_SECONDS", "600"))
+    # Every open stream holds a request thread, so serve with threads
+    # (gunicorn --threads N or -k gevent) and keep LIVE_MAX_SUBSCRIBERS below
+    # the threads per worker; further dashboards get 204 and no live updates.
+    # Streams end after LIVE_STREAM_SECONDS and EventSource reconnects with
+    # Last-Event-ID, so a stream never pins a thread indefinitely.
+    LIVE_MAX_SUBSCRIBERS = int(os.environ.get("LIVE_MAX_SUBSCRIBERS", "4"))
+    LIVE_STREAM_SECONDS = float(os.environ.get("LIVE_STREAM_SECONDS", "300"))
+    # Opportunity search result pages kept per worker. They expire with the
+    # VIEW_VERSION_TTL window or as soon as any worker changes an opportunity.
+    OPPORTUNITY_CACHE_SIZE = int(os.environ.get("OPPORTUNITY_CACHE_SIZE", "256"))
+    # Connections per worker process. Keep MONGO_MAX_POOL_SIZE times the number
+    # of workers under the server's connection limit.
+    MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "50"))
+    MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    # 0 waits for a reply indefinitely.
+    MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "0"))
+    # Run the bootstrap (collections, seed providers, indexes, migrations) in
+    # create_app(). Meant for single-process development; deployments run
+    # `flask bootstrap` once instead.
+    BOOTSTRAP_ON_START = os.environ.get("BOOTSTRAP_ON_START", "False") == "True"
 
 app = Flask(__name__)
 app.config.from_object(Config)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "CHANGE_ME")
 api = Api(app)
+assets.init_app(app)
 
-# Connect to MongoDB
-try:
-    client = MongoClient(app.config['MONGO_URI'])
-    db = client.get_default_database()
-except errors.ConnectionError as e:
-    print("Error connecting to MongoDB:", e)
-    exit(1)
+mongo_listeners = []
+if app.config['METRICS_ENABLED']:
+    metrics.init_app(app, server_timing=app.config['METRICS_SERVER_TIMING'])
+    mongo_listeners.append(metrics.MongoCommandMetrics(slow_ms=app.config['MONGO_SLOW_MS']))
 
-# Pre-create necessary collections
-for coll in ['users', 'opportunities', 'transactions', 'organizations', 'providers']:
-    if coll not in db.list_collection_names():
-        db.create_collection(coll)
+# ------------------------------
+# MongoDB connection
+# ------------------------------
+class MongoConnection:
+    """Per-process MongoClient, created on first use.
+
+    A PyMongo client must not cross a fork: its pooled sockets and monitor
+    threads belong to the process that created it. Nothing connects at import
+    time, and each child drops any client it inherited, so every worker of a
+    prefork server (with or without --preload) opens its own pool."""
+
+    def __init__(self, config, event_listeners):
+        self.config = config
+        self.event_listeners = event_listeners
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._client = None
+        self._db = None
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        with self._lock:
+            if self._client is None:
+                client = MongoClient(
+                    self.config['MONGO_URI'],
+                    event_listeners=self.event_listeners,
+                    maxPoolSize=self.config['MONGO_MAX_POOL_SIZE'],
+                    minPoolSize=self.config['MONGO_MIN_POOL_SIZE'],
+                    connectTimeoutMS=self.config['MONGO_CONNECT_TIMEOUT_MS'],
+                    serverSelectionTimeoutMS=self.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+                    socketTimeoutMS=self.config['MONGO_SOCKET_TIMEOUT_MS'] or None
+                )
+                self._db = client.get_default_database()
+                self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._connect()
+        return self._client
+
+    @property
+    def db(self):
+        if self._client is None:
+            self._connect()
+        return self._db
+
+    def collection(self, name):
+        coll = self._collections.get(name)
+        if coll is None:
+            coll = self._collections[name] = self.db[name]
+        return coll
+
+class LazyDatabase:
+    """Module-level stand-in for the Database; resolves in the current process."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getitem__(self, name):
+        return LazyCollection(self._connection, name)
+
+    def __getattr__(self, attr):
+        return getattr(self._connection.db, attr)
+
+class LazyCollection:
+    """Module-level stand-in for a Collection; resolves in the current process."""
+    __slots__ = ("_connection", "name")
+
+    def __init__(self, connection, name):
+        self._connection = connection
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._connection.collection(self.name), attr)
+
+mongo = MongoConnection(app.config, mongo_listeners)
+db = LazyDatabase(mongo)
+
+COLLECTIONS = ['users', 'opportunities', 'transactions', 'organizations', 'providers', 'events', 'balance_snapshots', 'donations', 'app_state', 'analytics_daily']
 
 users_collection = db['users']
 opportunities_collection = db['opportunities']
 transactions_collection = db['transactions']
 organizations_collection = db['organizations']
 providers_collection = db['providers']
+# Organization events, one document per event.
+events_collection = db['events']
+# Periodic per-user balances folded from the transactions ledger.
+balance_snapshots_collection = db['balance_snapshots']
+# One immutable record per donation; folded into users.amount_raised in batches.
+donations_collection = db['donations']
+# Small named documents holding checkpoints for background jobs.
+app_state_collection = db['app_state']
+# Daily credit totals per NGO, organization, provider and credit type, rolled up from the ledger.
+analytics_collection = db['analytics_daily']
+
+def run_unit_of_work(callback):
+    """Run callback(session) in a multi-document transaction when enabled.
+
+    Without MONGO_TRANSACTIONS the callback gets session=None and its writes
+    are applied one by one."""
+    if not app.config['MONGO_TRANSACTIONS']:
+        return callback(None)
+    with mongo.client.start_session() as mongo_session:
+        return mongo_session.with_transaction(callback)
+
+# Periodic jobs as (thread name, target(interval), interval config key). They
+# start with the first request each process serves: threads do not survive a
+# fork, and CLI commands that import the app should not run them.
+background_jobs = []
+background_pid = None
+background_lock = threading.Lock()
+
+def reset_background_lock():
+    global background_lock
+    background_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=reset_background_lock)
+
+def start_background_jobs():
+    global background_pid
+    with background_lock:
+        if background_pid == os.getpid():
+            return
+        background_pid = os.getpid()
+        for name, target, interval_key in background_jobs:
+            if app.config[interval_key] > 0:
+                threading.Thread(target=target, args=(app.config[interval_key],), name=name, daemon=True).start()
+
+def lease_holder():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def acquire_lease(name, seconds):
+    """Take or renew the app_state lease `name` for this process.
+
+    Returns False while another process holds an unexpired lease, so a job
+    that every worker schedules still runs in one place at a time."""
+    now = datetime.now(timezone.utc)
+    try:
+        app_state_collection.update_one(
+            {"_id": f"lease:{name}", "$or": [{"holder": lease_holder()}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"holder": lease_holder(), "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+    except errors.DuplicateKeyError:
+        return False
+    return True
+
+def release_lease(name):
+    app_state_collection.update_one(
+        {"_id": f"lease:{name}", "holder": lease_holder()},
+        {"$set": {"expires_at": datetime.now(timezone.utc)}}
+    )
+
+@app.before_request
+def ensure_background_jobs():
+    if background_pid != os.getpid():
+        start_background_jobs()
 
 def serialize_doc(doc):
     doc['_id'] = str(doc['_id'])
+    for key, value in doc.items():
+        if isinstance(value, datetime):
+            doc[key] = value.isoformat()
     return doc
 
+# ------------------------------
+# Read models
+# ------------------------------
+class ReadModel:
+    """Compact, read-only view of a document for one page.
+
+    FIELDS maps each field to its default and doubles as the query projection,
+    so views never load fields (passwords, event history) they do not render."""
+    __slots__ = ()
+    FIELDS = {}
+
+    @classmethod
+    def projection(cls):
+        projection = {field: 1 for field in cls.FIELDS}
+        if "_id" not in cls.FIELDS:
+            projection["_id"] = 0
+        return projection
+
+    @classmethod
+    def from_doc(cls, doc):
+        obj = cls.__new__(cls)
+        for field, default in cls.FIELDS.items():
+            setattr(obj, field, doc.get(field, default))
+        if "_id" in cls.FIELDS:
+            obj._id = str(obj._id)
+        return obj
+
+    @classmethod
+    def find(cls, collection, query, sort=None, limit=0):
+        cursor = collection.find(query, cls.projection())
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return [cls.from_doc(doc) for doc in cursor]
+
+    @classmethod
+    def find_one(cls, collection, query):
+        doc = collection.find_one(query, cls.projection())
+        return cls.from_doc(doc) if doc else None
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+class HomelessRow(ReadModel):
+    FIELDS = {"_id": None, "name": None, "shelter_credits": 0, "food_credits": 0, "org_assigned": None,
+              "event_assigned": "N/A", "org_assigned_id": "", "event_id": "", "event_index": 0,
+              "event_completed": False}
+    __slots__ = tuple(FIELDS)
+
+class HomelessOption(ReadModel):
+    FIELDS = {"_id": None, "name": None, "email": None}
+    __slots__ = tuple(FIELDS)
+
+class NGOSummary(ReadModel):
+    FIELDS = {"_id": None, "name": None, "amount_raised": 0, "donations_folded_through": None}
+    __slots__ = tuple(FIELDS)
+
+class NGOListing(ReadModel):
+    FIELDS = {"_id": None, "name": None, "cause": None, "amount_raised": 0, "donations_folded_through": None}
+    __slots__ = tuple(FIELDS)
+
+class ProviderOption(ReadModel):
+    FIELDS = {"_id": None, "provider_name": None, "provider_type": None, "available_quota": 0}
+    __slots__ = tuple(FIELDS)
+
+class OpenEventOption(ReadModel):
+    FIELDS = {"_id": None, "org_name": "Unnamed Organization", "eventName": None, "positions_available": 0}
+    __slots__ = tuple(FIELDS)
+
+class AssignmentCandidate(ReadModel):
+    FIELDS = {"_id": None, "name": None, "shelter_credits": 0, "food_credits": 0}
+    __slots__ = tuple(FIELDS)
+
+class OpenEventSlot(ReadModel):
+    FIELDS = {"_id": None, "org_id": None, "org_name": "Unnamed Organization", "eventName": None,
+              "positions_available": 0, "shelter_credits_offered": 0, "food_credits_offered": 0}
+    __slots__ = tuple(FIELDS)
+
+class OrgEventRow(ReadModel):
+    FIELDS = {"_id": None, "eventName": None, "positions_available": 0, "shelter_credits_offered": 0,
+              "food_credits_offered": 0, "status": "open"}
+    __slots__ = tuple(FIELDS)
+
+class OpportunityRow(ReadModel):
+    FIELDS = {"_id": None, "title": None, "description": "", "date": None, "location": "", "credit_type": ""}
+    __slots__ = tuple(FIELDS)
+
+# ------------------------------
+# Index registry
+# ------------------------------
+# Every index the app relies on, as (collection, keys, options). A `role` index
+# is not listed separately because (role, added_by) already serves role-only
+# queries through its prefix.
+INDEXES = [
+    ("users", [("email", ASCENDING)], {"unique": True, "partialFilterExpression": {"email": {"$type": "string"}}}),
+    ("users", [("role", ASCENDING), ("added_by", ASCENDING)], {}),
+    ("organizations", [("email", ASCENDING)], {"unique": True, "partialFilterExpression": {"email": {"$type": "string"}}}),
+    ("transactions", [("user", ASCENDING), ("_id", ASCENDING)], {}),
+    ("transactions", [("opening", ASCENDING)], {"unique": True, "partialFilterExpression": {"opening": {"$exists": True}}}),
+    ("events", [("org_id", ASCENDING), ("_id", DESCENDING)], {}),
+    ("events", [("status", ASCENDING), ("_id", ASCENDING)], {}),
+    ("events", [("org_id", ASCENDING), ("legacy_index", ASCENDING)],
+     {"unique": True, "partialFilterExpression": {"legacy_index": {"$exists": True}}}),
+    ("balance_snapshots", [("user", ASCENDING), ("_id", ASCENDING)], {}),
+    ("donations", [("ngo_id", ASCENDING), ("_id", ASCENDING)], {}),
+    ("analytics_daily", [("scope", ASCENDING), ("scope_id", ASCENDING), ("day", ASCENDING)], {}),
+    ("opportunities", [("title", TEXT), ("description", TEXT)],
+     {"name": "opportunity_text", "weights": {"title": 5, "description": 1}}),
+    ("opportunities", [("credit_type", ASCENDING), ("_id", DESCENDING)], {}),
+    ("opportunities", [("location_key", ASCENDING), ("_id", DESCENDING)], {}),
+]
+
+# Representative shapes of the queries the routes issue, as
+# (collection, filter, sort). check_query_plans() requires each to use an index.
+INDEXED_QUERIES = [
+    ("users", {"email": "check@example.invalid", "password": "x"}, None),
+    ("users", {"email": "check@example.invalid"}, None),
+    ("users", {"role": "homeless person", "added_by": "0" * 24}, None),
+    ("users", {"role": "ngo"}, None),
+    ("organizations", {"email": "check@example.invalid", "password": "x"}, None),
+    ("transactions", {"user": "0" * 24, "_id": {"$gt": ObjectId("0" * 24)}}, [("_id", ASCENDING)]),
+    ("events", {"status": "open"}, None),
+    ("events", {"org_id": "0" * 24, "_id": {"$lt": ObjectId("f" * 24)}}, [("_id", DESCENDING)]),
+    ("events", {"org_id": "0" * 24, "legacy_index": 0}, None),
+    ("balance_snapshots", {"user": {"$in": ["0" * 24]}}, [("user", DESCENDING), ("_id", DESCENDING)]),
+    ("donations", {"ngo_id": "0" * 24, "_id": {"$gt": ObjectId("0" * 24)}}, None),
+    ("analytics_daily", {"scope": "ngo", "scope_id": "0" * 24, "day": {"$gte": "2000-01-01", "$lte": "2000-12-31"}}, None),
+    ("opportunities", {"$text": {"$search": "check"}}, None),
+    ("opportunities", {"credit_type": "food", "_id": {"$lt": ObjectId("f" * 24)}}, [("_id", DESCENDING)]),
+    ("opportunities", {"location_key": "ottawa", "_id": {"$lt": ObjectId("f" * 24)}}, [("_id", DESCENDING)]),
+]
+
+# Indexes from earlier layouts that are unused or would reject valid writes, as (collection, name).
+RETIRED_INDEXES = [
+    ("events", "org_id_1_event_index_1"),
+    ("events", "positions_available_1"),
+]
+
+def ensure_indexes():
+    """Create every registered index and drop retired ones. Safe to run
+    repeatedly; returns a list of (collection, keys, error) for indexes that
+    could not be built."""
+    failures = []
+    for coll, name in RETIRED_INDEXES:
+        if name in db[coll].index_information():
+            db[coll].drop_index(name)
+    for coll, keys, options in INDEXES:
+        try:
+            db[coll].create_index(keys, **options)
+        except errors.OperationFailure as e:
+            failures.append((coll, keys, str(e)))
+    return failures
+
+def plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+def check_query_plans():
+    """Return the registered queries whose winning plan is a collection scan."""
+    collscans = []
+    for coll, query, sort in INDEXED_QUERIES:
+        cursor = db[coll].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in plan_stages(winning_plan):
+            collscans.append((coll, query))
+    return collscans
+
+@app.cli.command("ensure-indexes")
+def ensure_indexes_command():
+    failures = ensure_indexes()
+    for coll, keys, error in failures:
+        print(f"Could not create index {keys} on {coll}: {error}")
+    collscans = check_query_plans()
+    for coll, query in collscans:
+        print(f"Collection scan on {coll} for {query}")
+    if failures or collscans:
+        raise SystemExit(1)
+    print(f"{len(INDEXES)} indexes in place; {len(INDEXED_QUERIES)} queries use them.")
+
 # ------------------------------
 # Initialize sample providers if none exist
 # ------------------------------
-if providers_collection.count_documents({}) == 0:
-    sample_providers = [
-        {"provider_name": "Sunny Shelter", "provider_type": "shelter", "available_quota": 100},
-        {"provider_name": "Green Food Bank", "provider_type": "food bank", "available_quota": 200}
+def seed_providers():
+    if providers_collection.count_documents({}) == 0:
+        sample_providers = [
+            {"provider_name": "Sunny Shelter", "provider_type": "shelter", "available_quota": 100},
+            {"provider_name": "Green Food Bank", "provider_type": "food bank", "available_quota": 200}
+        ]
+        providers_collection.insert_many(sample_providers)
+
+class ProviderCatalog:
+    """In-process copy of the providers collection, keyed by id.
+
+    The list is small and changes rarely; quota changes made by this worker
+    are applied in place, and the TTL picks up everything else."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._providers = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self):
+        with self._lock:
+            if self._providers is None or time.monotonic() - self._loaded_at >= self.ttl:
+                providers = ProviderOption.find(providers_collection, {})
+                self._providers = {p._id: p for p in providers}
+                self._loaded_at = time.monotonic()
+            return self._providers
+
+    def all(self):
+        return list(self._current().values())
+
+    def get(self, provider_id):
+        return self._current().get(provider_id)
+
+    def update_quota(self, provider_id, quota):
+        provider = self._current().get(provider_id)
+        if provider:
+            provider.available_quota = quota
+
+    def invalidate(self):
+        with self._lock:
+            self._providers = None
+
+provider_catalog = ProviderCatalog(app.config['PROVIDER_CACHE_TTL'])
+
+PROVIDER_CREDIT_TYPES = {
+    "shelter": ("shelter", "credit based shelter"),
+    "food bank": ("food", "credit based food bank"),
+}
+
+class RedemptionRejected(Exception):
+    pass
+
+# ------------------------------
+# Organization events
+# ------------------------------
+# Events are documents of their own, addressed by _id. Organizations created
+# before this layout kept them in an embedded `events` array addressed by
+# position; migrate_embedded_events() moves those across and records the old
+# position as `legacy_index` so existing assignments can still be resolved.
+ORG_EVENTS_PAGE_SIZE = 20
+EVENT_MIGRATION_BATCH_SIZE = 500
+
+def event_status(positions_available):
+    return "open" if positions_available > 0 else "full"
+
+def new_event_doc(org_id, org_name, event_name, positions_available, shelter_offered, food_offered):
+    return {
+        "org_id": org_id,
+        "org_name": org_name,
+        "eventName": event_name,
+        "positions_available": positions_available,
+        "shelter_credits_offered": shelter_offered,
+        "food_credits_offered": food_offered,
+        "status": event_status(positions_available),
+        "created_at": datetime.now(timezone.utc)
+    }
+
+def adjust_positions(delta):
+    """Pipeline update moving positions_available by delta and keeping status in step."""
+    return [
+        {"$set": {"positions_available": {"$add": ["$positions_available", delta]}}},
+        {"$set": {"status": {"$cond": [{"$gt": ["$positions_available", 0]}, "open", "full"]}}}
     ]
-    providers_collection.insert_many(sample_providers)
+
+def claim_event_slot(event_id):
+    """Take one position of an event in a single conditional update.
+
+    Returns the event as it looks after the claim, or None if the event does
+    not exist or is already full."""
+    return events_collection.find_one_and_update(
+        {"_id": ObjectId(event_id), "positions_available": {"$gt": 0}},
+        adjust_positions(-1),
+        return_document=ReturnDocument.AFTER
+    )
+
+def release_event_slot(event_id):
+    events_collection.update_one({"_id": ObjectId(event_id)}, adjust_positions(1))
+
+def migrate_embedded_events(batch_size=EVENT_MIGRATION_BATCH_SIZE):
+    """Stream organizations that still embed events into the events collection.
+
+    Works through `batch_size` organizations at a time and strips the array
+    from each batch once its events are written, so an interrupted run resumes
+    where it stopped. Homeless records assigned by (org, position) get the new
+    event_id. Returns the number of events migrated."""
+    # Documents written by the old mirror carry event_index; rename it so the
+    # upserts below match them instead of creating duplicates.
+    events_collection.update_many(
+        {"event_index": {"$exists": True}, "legacy_index": {"$exists": False}},
+        {"$rename": {"event_index": "legacy_index"}}
+    )
+    migrated = 0
+    while True:
+        orgs = list(organizations_collection.find(
+            {"events": {"$exists": True}}, {"org_name": 1, "events": 1}
+        ).limit(batch_size))
+        if not orgs:
+            return migrated
+        event_ops = []
+        for org in orgs:
+            org_id = str(org["_id"])
+            org_name = org.get("org_name", "Unnamed Organization")
+            for idx, event in enumerate(org.get("events", [])):
+                doc = new_event_doc(org_id, org_name, event.get("eventName"), event.get("positions_available", 0),
+                                    event.get("shelter_credits_offered", 0), event.get("food_credits_offered", 0))
+                created_at = doc.pop("created_at")
+                event_ops.append(UpdateOne(
+                    {"org_id": org_id, "legacy_index": idx},
+                    {"$set": doc, "$setOnInsert": {"created_at": created_at}},
+                    upsert=True
+                ))
+        if event_ops:
+            events_collection.bulk_write(event_ops, ordered=False)
+            migrated += len(event_ops)
+        org_ids = [str(org["_id"]) for org in orgs]
+        assignment_ops = [
+            UpdateMany(
+                {"role": "homeless person", "org_assigned_id": event["org_id"],
+                 "event_index": event["legacy_index"], "event_id": {"$exists": False}},
+                {"$set": {"event_id": str(event["_id"])}}
+            )
+            for event in events_collection.find(
+                {"org_id": {"$in": org_ids}, "legacy_index": {"$exists": True}},
+                {"org_id": 1, "legacy_index": 1}
+            )
+        ]
+        if assignment_ops:
+            users_collection.bulk_write(assignment_ops, ordered=False)
+        organizations_collection.update_many(
+            {"_id": {"$in": [org["_id"] for org in orgs]}},
+            {"$unset": {"events": ""}}
+        )
+
+@app.cli.command("migrate-events")
+def migrate_events_command():
+    print(f"Migrated {migrate_embedded_events()} embedded events.")
+
+def bootstrap():
+    """One-time setup per deployment: collections, sample providers, indexes,
+    the embedded-events migration and opening balances for people added
+    before the ledger. Safe to re-run. Returns the index failures from
+    ensure_indexes()."""
+    existing = set(db.list_collection_names())
+    for coll in COLLECTIONS:
+        if coll not in existing:
+            db.create_collection(coll)
+    seed_providers()
+    failures = ensure_indexes()
+    if organizations_collection.find_one({"events": {"$exists": True}}, {"_id": 1}):
+        migrate_embedded_events()
+    backfill_opening_balances()
+    return failures
+
+@app.cli.command("bootstrap")
+def bootstrap_command():
+    failures = bootstrap()
+    for coll, keys, error in failures:
+        print(f"Could not create index {keys} on {coll}: {error}")
+    if failures:
+        raise SystemExit(1)
+    print(f"{len(COLLECTIONS)} collections and {len(INDEXES)} indexes in place.")
 
 # ------------------------------
 # Gemini Chatbot Helper Function
 # ------------------------------
-gemini_api_key = os.environ.get("GEMINI_API_KEY", "YOUR_API_KEY")
-gemini_client = genai.Client(api_key=gemini_api_key)
+GEMINI_MODEL = "gemini-2.0-flash"
 
-def get_ngo_info():
-    ngos = list(users_collection.find({"role": "ngo"}))
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGeminiModels:
+    """Stands in for genai's `client.models`, yielding one word per token."""
+
+    def __init__(self, token_delay):
+        self.token_delay = token_delay
+
+    def generate_content_stream(self, model, contents, config=None):
+        question = contents.rsplit("User:", 1)[-1].replace("Assistant:", "").strip()
+        for word in f"Eat & Earn can help with: {question}".split(" "):
+            time.sleep(self.token_delay)
+            yield FakeGeminiResponse(word + " ")
+
+    def generate_content(self, model, contents, config=None):
+        return FakeGeminiResponse("".join(c.text for c in self.generate_content_stream(model, contents, config)))
+
+class FakeGeminiClient:
+    def __init__(self, token_delay=0.05):
+        self.models = FakeGeminiModels(token_delay)
+
+class GeminiConnection:
+    """Per-process Gemini client, created on the first model call.
+
+    google.genai is imported here rather than at module level: it is the
+    slowest import in the app and most requests never reach the model."""
+
+    def __init__(self, config):
+        self.config = config
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def models(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create()
+        return self._client.models
+
+    def _create(self):
+        if self.config['GEMINI_CLIENT'] == "fake":
+            return FakeGeminiClient(self.config['GEMINI_FAKE_TOKEN_DELAY'])
+        from google import genai
+        gemini_api_key = os.environ.get("GEMINI_API_KEY", "YOUR_API_KEY")
+        return genai.Client(
+            api_key=gemini_api_key,
+            http_options={"timeout": int(self.config['GEMINI_TIMEOUT'] * 1000)}
+        )
+
+gemini_client = GeminiConnection(app.config)
+
+class LLMBusyError(Exception):
+    pass
+
+class LLMPool:
+    """Runs model calls on a small dedicated thread pool.
+
+    At most max_workers calls run at once and at most max_queue more wait;
+    beyond that submit() raises LLMBusyError right away, and a call still
+    queued after queue_wait seconds is dropped the same way, so request
+    workers never pile up behind slow model calls."""
+
+    def __init__(self, max_workers, max_queue, timeout, queue_wait):
+        self.timeout = timeout
+        self.queue_wait = queue_wait
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise LLMBusyError()
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def start(self, fn, *args):
+        """submit(), but raise LLMBusyError if fn has not started running
+        within queue_wait seconds."""
+        started = threading.Event()
+
+        def run():
+            started.set()
+            return fn(*args)
+
+        future = self.submit(run)
+        if not started.wait(self.queue_wait) and future.cancel():
+            raise LLMBusyError()
+        return future
+
+    def call(self, fn, *args):
+        return self.start(fn, *args).result(timeout=self.timeout)
+
+    def wait(self, future):
+        """Wait for a call another request started. Waiters take a slot too,
+        so they count against the same limit."""
+        if not self._slots.acquire(blocking=False):
+            raise LLMBusyError()
+        try:
+            return future.result(timeout=self.timeout)
+        finally:
+            self._slots.release()
+
+    def stream(self, token_iter_fn, *args):
+        """Start a streaming call and return a generator of ("token", text)
+        pairs ending with ("done", None) or ("error", message).
+
+        Raises LLMBusyError before anything is streamed if the pool is full
+        or the call stays queued too long."""
+        tokens = queue.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for token in token_iter_fn(*args):
+                    if cancelled.is_set():
+                        return
+                    tokens.put(("token", token))
+                tokens.put(("done", None))
+            except Exception as e:
+                tokens.put(("error", str(e)))
+
+        self.start(produce)
+        return self._drain(tokens, cancelled, time.monotonic() + self.timeout)
+
+    def _drain(self, tokens, cancelled, deadline):
+        try:
+            while True:
+                try:
+                    kind, value = tokens.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    yield "error", "The assistant took too long to answer."
+                    return
+                yield kind, value
+                if kind != "token":
+                    return
+        finally:
+            # Also reached when the client disconnects and the response is closed.
+            cancelled.set()
+
+llm_pool = LLMPool(app.config['GEMINI_MAX_CONCURRENCY'], app.config['GEMINI_MAX_QUEUE'],
+                   app.config['GEMINI_TIMEOUT'], app.config['GEMINI_QUEUE_WAIT'])
+
+class NGOContextCache:
+    """In-process cache of the NGO summary used in the chat prompt.
+
+    `version` changes whenever the cached text may have changed, so anything
+    derived from the summary can key on it. Local writes call invalidate();
+    the TTL picks up writes made by other workers."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.version = 0
+        self._text = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._text = None
+            self.version += 1
+
+    def get(self):
+        with self._lock:
+            if self._text is None or time.monotonic() - self._built_at >= self.ttl:
+                text = build_ngo_info()
+                if self._text is not None and text != self._text:
+                    self.version += 1
+                self._text = text
+                self._built_at = time.monotonic()
+            return self._text, self.version
+
+def build_ngo_info():
     ngos_info = []
-    for ngo in ngos:
-        ngo = serialize_doc(ngo)
-        cause = ngo.get("cause", "No cause provided")
-        ngos_info.append(f"{ngo['name']} ({cause})")
+    for ngo in users_collection.find({"role": "ngo"}, {"_id": 0, "name": 1, "cause": 1}):
+        cause = ngo.get("cause") or "No cause provided"
+        ngos_info.append(f"{ngo.get('name')} ({cause})")
     return ", ".join(ngos_info)
 
-def eat_and_earn_chat(user_question):
-    ngo_info = get_ngo_info()
+ngo_context = NGOContextCache(app.config['NGO_CONTEXT_TTL'])
+
+def get_ngo_info():
+    return ngo_context.get()[0]
+
+def build_chat_prompt(user_question, ngo_info=None):
+    if ngo_info is None:
+        ngo_info = get_ngo_info()
     background = f"""
     You are the Eat & Earn assistant.
     The Eat & Earn program awards credits to homeless people for volunteering and allows them to redeem these credits at credit-based food banks or shelters.
@@ -78,13 +863,248 @@ def eat_and_earn_chat(user_question):
     Current NGOs in the system: {ngo_info}.
     Always answer in a helpful and structured way, referencing Eat & Earn processes.
     """
-    full_prompt = f"{background}\nUser: {user_question}\nAssistant:"
-    response = gemini_client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=full_prompt
-    )
+    return f"{background}\nUser: {user_question}\nAssistant:"
+
+@metrics.timed_llm_call
+def generate_answer(full_prompt):
+    response = gemini_client.models.generate_content(model=GEMINI_MODEL, contents=full_prompt)
     return response.text
 
+@metrics.timed_llm_stream
+def generate_answer_tokens(full_prompt):
+    for chunk in gemini_client.models.generate_content_stream(model=GEMINI_MODEL, contents=full_prompt):
+        if chunk.text:
+            yield chunk.text
+
+def normalize_prompt(prompt):
+    return re.sub(r"\s+", " ", prompt).strip().strip("?!. ").lower()
+
+class ChatAnswerCache:
+    """LRU/TTL cache of assistant answers with single-flight de-duplication.
+
+    Keys combine the normalized prompt with the NGO context version, and the
+    whole cache is dropped as soon as a newer version is seen, so answers never
+    describe a stale NGO list. While one request computes an answer, identical
+    requests wait on its Future instead of calling the model again."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def claim(self, prompt, version):
+        """Returns (key, answer, future, is_leader).
+
+        On a hit `answer` is set. Otherwise `future` resolves to the answer;
+        if is_leader is True the caller must compute it and call resolve() or
+        reject() with the key."""
+        key = (version, normalize_prompt(prompt))
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return key, entry[0], None, False
+            self._entries.pop(key, None)
+            future = self._inflight.get(key)
+            if future:
+                self.coalesced += 1
+                return key, None, future, False
+            self.misses += 1
+            future = self._inflight[key] = Future()
+            return key, None, future, True
+
+    def resolve(self, key, answer):
+        with self._lock:
+            future = self._inflight.pop(key, None)
+            if key[0] == self._version:
+                self._entries[key] = (answer, time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        if future:
+            future.set_result(answer)
+
+    def reject(self, key, error):
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future:
+            future.set_exception(error)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "size": len(self._entries)}
+
+chat_cache = ChatAnswerCache(app.config['CHAT_CACHE_SIZE'], app.config['CHAT_CACHE_TTL'])
+for stat in ["hits", "misses", "coalesced"]:
+    metrics.registry.gauge(f"chat_cache_{stat}", f"Chat answer cache {stat} since start.",
+                           lambda stat=stat: chat_cache.stats()[stat])
+
+def eat_and_earn_chat(user_question):
+    ngo_info, version = ngo_context.get()
+    key, answer, future, is_leader = chat_cache.claim(user_question, version)
+    if answer is not None:
+        return answer
+    if not is_leader:
+        return llm_pool.wait(future)
+    try:
+        answer = llm_pool.call(generate_answer, build_chat_prompt(user_question, ngo_info))
+    except Exception as e:
+        chat_cache.reject(key, e)
+        raise
+    chat_cache.resolve(key, answer)
+    return answer
+
+def eat_and_earn_chat_stream(user_question):
+    ngo_info, version = ngo_context.get()
+    key, answer, future, is_leader = chat_cache.claim(user_question, version)
+    if answer is not None:
+        return iter([("token", answer), ("done", None)])
+    if not is_leader:
+        # Waiting happens before the response starts, through the pool's
+        # limit, so a busy pool answers 503 like any other chat.
+        try:
+            answer = llm_pool.wait(future)
+        except LLMBusyError:
+            raise
+        except FutureTimeoutError:
+            return iter([("error", "The assistant took too long to answer.")])
+        except Exception:
+            return iter([("error", "Sorry, something went wrong. Please try again.")])
+        return iter([("token", answer), ("done", None)])
+    try:
+        events = llm_pool.stream(generate_answer_tokens, build_chat_prompt(user_question, ngo_info))
+    except LLMBusyError as e:
+        chat_cache.reject(key, e)
+        raise
+    return StreamedAnswer(key, events)
+
+class StreamedAnswer:
+    """A leader's streamed answer, recorded in chat_cache once it completes.
+
+    close() releases identical requests waiting on it if the answer did not
+    complete, even when the response was closed before iteration began."""
+
+    def __init__(self, key, events):
+        self.key = key
+        self.events = events
+        self.finished = False
+
+    def __iter__(self):
+        tokens = []
+        try:
+            for kind, value in self.events:
+                if kind == "token":
+                    tokens.append(value)
+                elif kind == "done":
+                    chat_cache.resolve(self.key, "".join(tokens))
+                    self.finished = True
+                yield kind, value
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.finished:
+            # Error, timeout or client disconnect: release any waiters.
+            chat_cache.reject(self.key, RuntimeError("Answer stream did not complete"))
+        self.events.close()
+
+# ------------------------------
+# Page versions and rendered page cache
+# ------------------------------
+class ViewVersions:
+    """Shared version counters for the data behind cacheable pages.
+
+    Write routes bump the keys they affect right after the write, and a
+    page's ETag is built from the counters of its keys. The counters are
+    app_state documents ("view:<key>"), so every worker sees a write as soon
+    as it is made, at the cost of one _id lookup per page. Background jobs
+    (such as the donation fold) do not bump, so every tag also carries the
+    current TTL window and lapses after at most `ttl` seconds."""
+
+    def __init__(self, collection, ttl):
+        self.collection = collection
+        self.ttl = ttl
+
+    def bump(self, *keys):
+        self.collection.bulk_write([
+            UpdateOne({"_id": f"view:{key}"}, {"$inc": {"version": 1}}, upsert=True) for key in keys
+        ], ordered=False)
+
+    def etag(self, *keys):
+        window = int(time.time() // self.ttl) if self.ttl > 0 else 0
+        found = {
+            doc["_id"]: doc["version"]
+            for doc in self.collection.find({"_id": {"$in": [f"view:{key}" for key in keys]}}, {"version": 1})
+        }
+        counters = "-".join(str(found.get(f"view:{key}", 0)) for key in keys)
+        return f"{window}-{counters}"
+
+class RenderedPageCache:
+    """Bounded LRU of rendered pages keyed by (ETag, viewer)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+view_versions = ViewVersions(app_state_collection, app.config['VIEW_VERSION_TTL'])
+page_cache = RenderedPageCache(app.config['VIEW_CACHE_SIZE'])
+for stat in ["hits", "misses"]:
+    metrics.registry.gauge(f"page_cache_{stat}", f"Rendered page cache {stat} since start.",
+                           lambda stat=stat: getattr(page_cache, stat))
+
+def cached_page(keys, viewer, render):
+    """Serve a page whose content depends only on `keys` and `viewer`.
+
+    Returns 304 when the client already holds the current version, the cached
+    body when this worker rendered it before, and otherwise calls render().
+    The viewer is part of the tag, so a browser shared by several accounts
+    never gets a 304 for a page rendered for someone else."""
+    viewer_tag = hashlib.sha1(repr(viewer).encode()).hexdigest()[:12]
+    etag = f"{view_versions.etag(*keys)}-{viewer_tag}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        cache_key = (etag, viewer)
+        body = page_cache.get(cache_key)
+        if body is None:
+            body = render()
+            page_cache.put(cache_key, body)
+        response = make_response(body)
+    response.set_etag(etag)
+    # The page is per viewer and must be revalidated on every load.
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
 # ------------------------------
 # Decorators
 # ------------------------------
@@ -111,7 +1131,7 @@ def sign_in():
         email = request.form.get('email')
         password = request.form.get('password')
         # Check in users collection (NGO and normal user)
-        user = users_collection.find_one({"email": email, "password": password})
+        user = users_collection.find_one({"email": email, "password": password}, {"role": 1})
         if user:
             session['user_id'] = str(user['_id'])
             session['role'] = user.get('role', '').lower()
@@ -121,7 +1141,7 @@ def sign_in():
                 return redirect(url_for('list_ngos_for_user'))
         else:
             # Check if organization
-            org = organizations_collection.find_one({"email": email, "password": password})
+            org = organizations_collection.find_one({"email": email, "password": password}, {"_id": 1})
             if org:
                 session['user_id'] = str(org['_id'])
                 session['role'] = "organization"
@@ -144,7 +1164,13 @@ def sign_up():
             new_user['amount_raised'] = 0  # Initialize donation total
         if users_collection.find_one({"email": email}):
             return "User with that email already exists. <a href='/sign_in'>Sign in instead</a>"
-        result = users_collection.insert_one(new_user)
+        try:
+            result = users_collection.insert_one(new_user)
+        except errors.DuplicateKeyError:
+            return "User with that email already exists. <a href='/sign_in'>Sign in instead</a>"
+        if role == 'ngo':
+            ngo_context.invalidate()
+            view_versions.bump("ngos")
         session['user_id'] = str(result.inserted_id)
         session['role'] = role
         if role == 'ngo':
@@ -165,10 +1191,12 @@ def enroll_org():
         new_org = {
             "org_name": org_name,
             "email": email,
-            "password": password,
-            "events": []
+            "password": password
         }
-        result = organizations_collection.insert_one(new_org)
+        try:
+            result = organizations_collection.insert_one(new_org)
+        except errors.DuplicateKeyError:
+            return "Organization with that email already exists. <a href='/sign_in'>Sign in instead</a>"
         session['user_id'] = str(result.inserted_id)
         session['role'] = "organization"
         return redirect(url_for('org_manage_page'))
@@ -187,12 +1215,17 @@ def web_ngo_dashboard():
     if session['role'] != 'ngo':
         return "Access denied. Only NGOs allowed."
     ngo_id = session['user_id']
-    homeless = list(users_collection.find({"role": "homeless person", "added_by": ngo_id}))
-    homeless = [serialize_doc(u) for u in homeless]
-    # Fetch NGO's own record to show donation amount
-    ngo_record = users_collection.find_one({"_id": ObjectId(ngo_id)})
-    ngo_record = serialize_doc(ngo_record)
-    return render_template('ngo_dashboard.html', homeless=homeless, ngo=ngo_record)
+
+    def render():
+        homeless = HomelessRow.find(users_collection, {"role": "homeless person", "added_by": ngo_id})
+        # Fetch NGO's own record to show donation amount
+        ngo_record = NGOSummary.find_one(users_collection, {"_id": ObjectId(ngo_id)})
+        add_pending_donations([ngo_record])
+        weekly = analytics_report("ngo", ngo_id, *default_report_range(), period="week")
+        # Row state for the live-update script, which re-renders assignments from it.
+        members = {h._id: h.as_dict() for h in homeless}
+        return render_template('ngo_dashboard.html', homeless=homeless, members=members, ngo=ngo_record, weekly=weekly)
+    return cached_page([f"ngo:{ngo_id}", "credits", "analytics"], ngo_id, render)
 
 @app.route('/web/ngo/add-homeless', methods=['GET', 'POST'])
 @requires_login
@@ -215,9 +1248,162 @@ def web_ngo_add_homeless():
             "food_credits": food_credits,
             "added_by": added_by
         }
-        users_collection.insert_one(homeless_data)
+        def add(mongo_session):
+            result = users_collection.insert_one(homeless_data, session=mongo_session)
+            opening = opening_balance_entries(str(result.inserted_id), shelter_credits, food_credits)
+            if opening:
+                transactions_collection.insert_many(opening, session=mongo_session)
+        try:
+            run_unit_of_work(add)
+        except errors.DuplicateKeyError:
+            return "A person with that email already exists. <a href='/web/ngo/add-homeless'>Try again</a>"
+        view_versions.bump(f"ngo:{added_by}")
         return redirect(url_for('web_ngo_dashboard'))
 
+# ------------------------------
+# Bulk homeless import
+# ------------------------------
+# Rows are read straight from the uploaded file (Werkzeug spools large uploads
+# to disk) and written IMPORT_BATCH_SIZE at a time, so memory stays flat however
+# long the file is. Duplicate emails, in the file or already registered, are
+# left to the unique index rather than checked up front.
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+IMPORT_COLUMNS = ["name", "email", "shelter_credits", "food_credits"]
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+def normalize_header(header):
+    return [str(h or "").strip().lower().replace(" ", "_") for h in header]
+
+def iter_csv_rows(stream):
+    """Yield (row_number, {column: value}) from a CSV upload, row 2 being the first data row."""
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    header = normalize_header(next(reader, []))
+    for row_number, values in enumerate(reader, start=2):
+        if any(v.strip() for v in values):
+            yield row_number, dict(zip(header, values))
+
+def iter_xlsx_rows(stream):
+    """Yield (row_number, {column: value}) from the first sheet of an XLSX upload.
+
+    Needs openpyxl; read-only mode keeps only the current row in memory."""
+    from openpyxl import load_workbook
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = normalize_header(next(rows, []))
+        for row_number, values in enumerate(rows, start=2):
+            if any(v not in (None, "") for v in values):
+                yield row_number, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+def parse_credit(value):
+    if value is None or str(value).strip() == "":
+        return 0
+    number = float(value)
+    if number != int(number) or number < 0:
+        raise ValueError
+    return int(number)
+
+def validate_homeless_row(row):
+    """Return (homeless fields, None) for a valid row or (None, error message)."""
+    name = str(row.get("name") or "").strip()
+    email = str(row.get("email") or "").strip()
+    if not name:
+        return None, "Missing name"
+    if not EMAIL_PATTERN.match(email):
+        return None, "Invalid email"
+    credits = {}
+    for field in ["shelter_credits", "food_credits"]:
+        try:
+            credits[field] = parse_credit(row.get(field))
+        except (TypeError, ValueError):
+            return None, f"{field} must be a whole number of zero or more"
+    return {"name": name, "email": email, **credits}, None
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    def to_dict(self):
+        return {"rows": self.rows, "inserted": self.inserted, "failed": self.failed,
+                "errors": sorted(self.errors, key=lambda e: e["row"]), "errors_truncated": self.failed > len(self.errors)}
+
+def insert_homeless_batch(batch, report):
+    """Insert one batch of (row_number, doc) unordered and post opening balances for the rows that landed."""
+    docs = [doc for _, doc in batch]
+    rejected = set()
+    try:
+        users_collection.insert_many(docs, ordered=False)
+    except errors.BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            rejected.add(write_error["index"])
+            message = "Email already registered" if write_error.get("code") == 11000 else write_error.get("errmsg")
+            report.error(batch[write_error["index"]][0], message)
+    opening = []
+    for index, doc in enumerate(docs):
+        if index not in rejected:
+            report.inserted += 1
+            opening.extend(opening_balance_entries(str(doc["_id"]), doc["shelter_credits"], doc["food_credits"]))
+    if opening:
+        transactions_collection.insert_many(opening, ordered=False)
+
+def import_homeless_rows(rows, added_by, batch_size=IMPORT_BATCH_SIZE):
+    report = ImportReport()
+    batch = []
+    for row_number, row in rows:
+        report.rows += 1
+        fields, error = validate_homeless_row(row)
+        if error:
+            report.error(row_number, error)
+            continue
+        batch.append((row_number, dict(fields, role="homeless person", added_by=added_by)))
+        if len(batch) >= batch_size:
+            insert_homeless_batch(batch, report)
+            batch = []
+    if batch:
+        insert_homeless_batch(batch, report)
+    return report
+
+@app.route('/web/ngo/import-homeless', methods=['GET', 'POST'])
+@requires_login
+def web_ngo_import_homeless():
+    if session['role'] != 'ngo':
+        return "Access denied. Only NGOs allowed."
+    if request.method == 'GET':
+        return render_template('import_homeless.html', columns=IMPORT_COLUMNS)
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return "No file uploaded. <a href='/web/ngo/import-homeless'>Try again</a>", 400
+    filename = upload.filename.lower()
+    if filename.endswith(".csv"):
+        rows = iter_csv_rows(upload.stream)
+    elif filename.endswith(".xlsx"):
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            return "XLSX import is not available on this server; upload a CSV instead.", 400
+        rows = iter_xlsx_rows(upload.stream)
+    else:
+        return "Upload a .csv or .xlsx file. <a href='/web/ngo/import-homeless'>Try again</a>", 400
+    try:
+        report = import_homeless_rows(rows, session['user_id'])
+    except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile) as e:
+        return f"Could not read the file: {e}", 400
+    view_versions.bump(f"ngo:{session['user_id']}")
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(report.to_dict())
+    return render_template('import_homeless.html', columns=IMPORT_COLUMNS, report=report.to_dict())
+
 # NGO assigns a homeless person to an organization's event.
 @app.route('/web/ngo/assign_org', methods=['GET', 'POST'])
 @requires_login
@@ -226,52 +1412,198 @@ def assign_org():
         return "Access denied. Only NGOs can assign volunteers."
     if request.method == 'GET':
         ngo_id = session['user_id']
-        homeless_list = list(users_collection.find({"role": "homeless person", "added_by": ngo_id}))
-        homeless_list = [serialize_doc(h) for h in homeless_list]
-        events = []
-        for org in organizations_collection.find():
-            org = serialize_doc(org)
-            if "events" in org:
-                for idx, event in enumerate(org["events"]):
-                    if event.get("positions_available", 0) > 0:
-                        event["org_id"] = org["_id"]
-                        event["org_name"] = org.get("org_name", "Unnamed Organization")
-                        event["event_index"] = idx
-                        events.append(event)
+        homeless_list = HomelessOption.find(users_collection, {"role": "homeless person", "added_by": ngo_id})
+        events = OpenEventOption.find(events_collection, {"status": "open"})
         return render_template('assign_org.html', homeless_list=homeless_list, events=events)
     else:
         homeless_id = request.form.get('homeless_id')
-        selected = request.form.get('selected_event')
-        try:
-            org_id, event_index = selected.split("|")
-            event_index = int(event_index)
-        except Exception:
+        event_id = request.form.get('selected_event')
+        if not ObjectId.is_valid(event_id) or not ObjectId.is_valid(homeless_id):
             return "Invalid event selection.", 400
-        org = organizations_collection.find_one({"_id": ObjectId(org_id)})
-        if not org:
-            return "Organization not found.", 404
-        if "events" not in org or len(org["events"]) <= event_index:
-            return "Event not found.", 404
-        event = org["events"][event_index]
-        if event.get("positions_available", 0) <= 0:
-            return "No positions available in that event.", 400
-        new_positions = event["positions_available"] - 1
-        organizations_collection.update_one(
-            {"_id": ObjectId(org_id)},
-            {"$set": {f"events.{event_index}.positions_available": new_positions}}
-        )
-        users_collection.update_one(
-            {"_id": ObjectId(homeless_id)},
+        event = claim_event_slot(event_id)
+        if not event:
+            return "Event not found or no positions available.", 400
+        # Credit offers are captured now so completion never has to re-read the event.
+        result = users_collection.update_one(
+            {"_id": ObjectId(homeless_id), "role": "homeless person"},
             {"$set": {
-                "org_assigned": org.get("org_name", "Unnamed Organization"),
+                "org_assigned": event.get("org_name", "Unnamed Organization"),
                 "event_assigned": event.get("eventName", "Unnamed Event"),
-                "org_assigned_id": org_id,
-                "event_index": event_index,
+                "org_assigned_id": event["org_id"],
+                "event_id": event_id,
+                "event_credits": {
+                    "shelter": event.get("shelter_credits_offered", 0),
+                    "food": event.get("food_credits_offered", 0)
+                },
                 "event_completed": False
             }}
         )
+        if result.matched_count == 0:
+            release_event_slot(event_id)
+            return "Homeless record not found.", 404
+        view_versions.bump(f"ngo:{session['user_id']}")
         return redirect(url_for('web_ngo_dashboard'))
 
+# ------------------------------
+# Auto-assignment
+# ------------------------------
+# Matches an NGO's unassigned people to open event positions in one pass.
+# Events offering the same (shelter, food) credits are interchangeable, so each
+# person only compares the distinct offers that are not beaten on both credit
+# types by another offer with positions left, which keeps planning close to
+# linear in the number of people.
+ASSIGNMENT_STRATEGIES = ["credits", "balance"]
+UNASSIGNED = {"$or": [{"org_assigned": None}, {"event_completed": True}]}
+
+def offer_weights(person, strategy):
+    """How much one shelter and one food credit are worth to this person."""
+    if strategy == "balance":
+        return 1 / (1 + max(person.shelter_credits, 0)), 1 / (1 + max(person.food_credits, 0))
+    return 1, 1
+
+def pareto_offers(offers):
+    """Offers not dominated on both credit types by another offer."""
+    frontier = []
+    best_food = -1
+    for shelter, food in sorted(offers, reverse=True):
+        if food > best_food:
+            frontier.append((shelter, food))
+            best_food = food
+    return frontier
+
+def plan_assignments(people, events, strategy="credits"):
+    """Return [(person, event)] giving each person at most one open position.
+
+    People with the fewest credits choose first. "credits" gives them the
+    largest total offer; "balance" weights each credit type by how little of it
+    the person holds."""
+    slots = {}
+    for event in sorted(events, key=lambda e: e._id):
+        if event.positions_available > 0:
+            offer = (event.shelter_credits_offered or 0, event.food_credits_offered or 0)
+            slots.setdefault(offer, []).append([event, event.positions_available])
+    frontier = pareto_offers(slots)
+    plan = []
+    for person in sorted(people, key=lambda p: (p.shelter_credits + p.food_credits, p._id)):
+        if not frontier:
+            break
+        shelter_weight, food_weight = offer_weights(person, strategy)
+        offer = max(frontier, key=lambda o: (shelter_weight * o[0] + food_weight * o[1], o))
+        queue = slots[offer]
+        queue[0][1] -= 1
+        plan.append((person, queue[0][0]))
+        if queue[0][1] == 0:
+            queue.pop(0)
+            if not queue:
+                del slots[offer]
+                frontier = pareto_offers(slots)
+    return plan
+
+def preview_assignments(ngo_id, strategy="credits", org_id=None):
+    """Plan assignments for an NGO's unassigned people over every open event,
+    or only org_id's events when given."""
+    people = AssignmentCandidate.find(users_collection, dict(UNASSIGNED, role="homeless person", added_by=ngo_id))
+    event_query = {"status": "open", "org_id": org_id} if org_id else {"status": "open"}
+    events = OpenEventSlot.find(events_collection, event_query)
+    return plan_assignments(people, events, strategy)
+
+def apply_assignments(plan):
+    """Claim positions and assign people for a plan with a fixed number of bulk writes.
+
+    Each write is conditional: an event that filled up or a person assigned
+    elsewhere since the plan was made is skipped, and any position claimed for
+    them is released. Returns the (person, event) pairs that were applied."""
+    if not plan:
+        return []
+    batch = str(ObjectId())
+    wanted = {}
+    for _, event in plan:
+        wanted[event._id] = wanted.get(event._id, 0) + 1
+    result = events_collection.bulk_write([
+        UpdateOne(
+            {"_id": ObjectId(event_id), "positions_available": {"$gte": count}},
+            {"$inc": {"positions_available": -count}, "$set": {f"claims.{batch}": count}}
+        )
+        for event_id, count in wanted.items()
+    ], ordered=False)
+    event_oids = [ObjectId(event_id) for event_id in wanted]
+    if result.matched_count == len(wanted):
+        claimed = set(wanted)
+    else:
+        claimed = {str(e["_id"]) for e in events_collection.find(
+            {"_id": {"$in": event_oids}, f"claims.{batch}": {"$exists": True}}, {"_id": 1})}
+    events_collection.update_many({"_id": {"$in": event_oids}}, {"$unset": {f"claims.{batch}": ""}})
+    events_collection.update_many(
+        {"_id": {"$in": event_oids}, "positions_available": {"$lte": 0}, "status": "open"},
+        {"$set": {"status": "full"}}
+    )
+
+    plan = [(person, event) for person, event in plan if event._id in claimed]
+    if plan:
+        users_collection.bulk_write([
+            UpdateOne(
+                dict(UNASSIGNED, _id=ObjectId(person._id), role="homeless person"),
+                {"$set": {
+                    "org_assigned": event.org_name,
+                    "event_assigned": event.eventName or "Unnamed Event",
+                    "org_assigned_id": event.org_id,
+                    "event_id": event._id,
+                    "event_credits": {"shelter": event.shelter_credits_offered or 0,
+                                      "food": event.food_credits_offered or 0},
+                    "event_completed": False,
+                    "assignment_batch": batch
+                }}
+            )
+            for person, event in plan
+        ], ordered=False)
+        assigned = {str(doc["_id"]) for doc in users_collection.find(
+            {"_id": {"$in": [ObjectId(person._id) for person, _ in plan]}, "assignment_batch": batch}, {"_id": 1})}
+    else:
+        assigned = set()
+
+    unused = dict(wanted)
+    for person, event in plan:
+        if person._id in assigned:
+            unused[event._id] -= 1
+    releases = {event_id: count for event_id, count in unused.items() if event_id in claimed and count > 0}
+    if releases:
+        events_collection.bulk_write([
+            UpdateOne({"_id": ObjectId(event_id)}, adjust_positions(count))
+            for event_id, count in releases.items()
+        ], ordered=False)
+    return [(person, event) for person, event in plan if person._id in assigned]
+
+def assignment_rows(plan):
+    return [{
+        "homeless_id": person._id,
+        "name": person.name,
+        "event_id": event._id,
+        "org_name": event.org_name,
+        "eventName": event.eventName,
+        "shelter_credits": event.shelter_credits_offered or 0,
+        "food_credits": event.food_credits_offered or 0
+    } for person, event in plan]
+
+@app.route('/web/ngo/auto_assign', methods=['GET', 'POST'])
+@requires_login
+def auto_assign():
+    """GET previews the matching (a dry run); POST recomputes and applies it."""
+    if session['role'] != 'ngo':
+        return "Access denied. Only NGOs can assign volunteers."
+    strategy = request.values.get('strategy', 'credits')
+    if strategy not in ASSIGNMENT_STRATEGIES:
+        return "Invalid strategy.", 400
+    plan = preview_assignments(session['user_id'], strategy)
+    if request.method == 'POST':
+        plan = apply_assignments(plan)
+        view_versions.bump(f"ngo:{session['user_id']}")
+    rows = assignment_rows(plan)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"strategy": strategy, "applied": request.method == 'POST', "assignments": rows})
+    if request.method == 'POST':
+        return redirect(url_for('web_ngo_dashboard'))
+    return render_template('auto_assign.html', strategy=strategy, strategies=ASSIGNMENT_STRATEGIES, rows=rows)
+
 # NGO marks an event as done for a homeless person.
 @app.route('/web/ngo/mark_event_done', methods=['POST'])
 @requires_login
@@ -279,21 +1611,57 @@ def mark_event_done():
     if session['role'] != 'ngo':
         return "Access denied. Only NGOs can mark events as done."
     homeless_id = request.form.get('homeless_id')
-    org_id = request.form.get('org_id')
-    event_index = int(request.form.get('event_index', -1))
-    org = organizations_collection.find_one({"_id": ObjectId(org_id)})
-    if not org or "events" not in org or len(org["events"]) <= event_index:
+    def complete(mongo_session):
+        # Award the credits captured at assignment time; the event_completed guard
+        # makes a repeated submit a no-op instead of a second award.
+        homeless = users_collection.find_one_and_update(
+            {"_id": ObjectId(homeless_id), "event_completed": False, "event_credits": {"$exists": True}},
+            [{"$set": {
+                "shelter_credits": {"$add": [{"$ifNull": ["$shelter_credits", 0]}, "$event_credits.shelter"]},
+                "food_credits": {"$add": [{"$ifNull": ["$food_credits", 0]}, "$event_credits.food"]},
+                "event_completed": True
+            }}],
+            projection={"event_credits": 1, "org_assigned_id": 1},
+            session=mongo_session
+        )
+        if homeless:
+            credits = homeless["event_credits"]
+        else:
+            # Assignments made before offers were captured still need the event lookup.
+            event_id = request.form.get('event_id')
+            org_id = request.form.get('org_id')
+            event_index = int(request.form.get('event_index') or -1)
+            if ObjectId.is_valid(event_id):
+                event = events_collection.find_one({"_id": ObjectId(event_id)}, session=mongo_session)
+            elif event_index >= 0 and org_id:
+                event = events_collection.find_one({"org_id": org_id, "legacy_index": event_index},
+                                                   session=mongo_session)
+            else:
+                event = None
+            if not event:
+                return False
+            credits = {"shelter": event.get("shelter_credits_offered", 0), "food": event.get("food_credits_offered", 0)}
+            homeless = users_collection.find_one_and_update(
+                {"_id": ObjectId(homeless_id), "event_completed": False, "event_credits": {"$exists": False}},
+                {
+                    "$inc": {"shelter_credits": credits["shelter"], "food_credits": credits["food"]},
+                    "$set": {"event_completed": True}
+                },
+                projection={"org_assigned_id": 1},
+                session=mongo_session
+            )
+        if homeless:
+            entries = [
+                ledger_entry(homeless_id, "earn", credit_type, amount, "volunteering workplace",
+                             org_id=homeless.get("org_assigned_id"))
+                for credit_type, amount in credits.items() if amount > 0
+            ]
+            if entries:
+                transactions_collection.insert_many(entries, session=mongo_session)
+        return True
+    if not run_unit_of_work(complete):
         return "Event not found.", 404
-    event = org["events"][event_index]
-    shelter_offered = event.get("shelter_credits_offered", 0)
-    food_offered = event.get("food_credits_offered", 0)
-    users_collection.update_one(
-        {"_id": ObjectId(homeless_id)},
-        {
-            "$inc": {"shelter_credits": shelter_offered, "food_credits": food_offered},
-            "$set": {"event_completed": True}
-        }
-    )
+    view_versions.bump(f"ngo:{session['user_id']}")
     return redirect(url_for('web_ngo_dashboard'))
 
 # ------------------------------
@@ -304,9 +1672,12 @@ def mark_event_done():
 def list_ngos_for_user():
     if session['role'] in ['ngo', 'organization']:
         return "Access denied. Only normal users allowed."
-    ngos = list(users_collection.find({"role": "ngo"}))
-    ngos = [serialize_doc(n) for n in ngos]
-    return render_template('list_ngos.html', ngos=ngos)
+    def render():
+        ngos = NGOListing.find(users_collection, {"role": "ngo"})
+        add_pending_donations(ngos)
+        return render_template('list_ngos.html', ngos=ngos)
+    # The listing is the same for every user.
+    return cached_page(["ngos"], "user", render)
 
 # ------------------------------
 # Donation Route for Normal Users
@@ -323,13 +1694,107 @@ def donate_ngo():
         return "Invalid donation amount.", 400
     if donation <= 0:
         return "Donation must be greater than zero."
-    # Increment the NGO's amount_raised field in the users collection.
-    users_collection.update_one(
-        {"_id": ObjectId(ngo_id), "role": "ngo"},
-        {"$inc": {"amount_raised": donation}}
-    )
+    if not ObjectId.is_valid(ngo_id) or not users_collection.find_one({"_id": ObjectId(ngo_id), "role": "ngo"}, {"_id": 1}):
+        return "NGO not found.", 404
+    # Recorded as its own document; fold_donations() adds it to amount_raised later,
+    # so popular NGOs do not turn every donation into a write on one hot document.
+    donations_collection.insert_one({
+        "ngo_id": ngo_id,
+        "amount": donation,
+        "donor_id": session['user_id'],
+        "created_at": datetime.now(timezone.utc)
+    })
+    view_versions.bump("ngos", f"ngo:{ngo_id}")
     return redirect(url_for('list_ngos_for_user'))
 
+def pending_donations(watermarks):
+    """Sum donations not yet folded, given {ngo_id: donations_folded_through}."""
+    if not watermarks:
+        return {}
+    branches = [
+        {"ngo_id": ngo_id, "_id": {"$gt": folded_through}} if folded_through else {"ngo_id": ngo_id}
+        for ngo_id, folded_through in watermarks.items()
+    ]
+    pending = donations_collection.aggregate([
+        {"$match": {"$or": branches}},
+        {"$group": {"_id": "$ngo_id", "amount": {"$sum": "$amount"}}}
+    ])
+    return {row["_id"]: row["amount"] for row in pending}
+
+def add_pending_donations(ngos):
+    """Bring each NGO read model's amount_raised up to date with unfolded donations."""
+    pending = pending_donations({ngo._id: ngo.donations_folded_through for ngo in ngos if ngo})
+    for ngo in ngos:
+        if ngo:
+            ngo.amount_raised += pending.get(ngo._id, 0)
+
+def fold_donations():
+    """Fold donations older than DONATION_FOLD_LAG into users.amount_raised.
+
+    Each NGO records how far it has been folded (donations_folded_through) and
+    is only updated if that watermark is unchanged, so concurrent or repeated
+    runs never count a donation twice. Returns the number of NGOs updated."""
+    state = app_state_collection.find_one({"_id": "donation_fold"}) or {}
+    low = state.get("folded_through")
+    cutoff = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=app.config['DONATION_FOLD_LAG']))
+    if low and low >= cutoff:
+        return 0
+    sums = donation_sums({"$gt": low, "$lte": cutoff} if low else {"$lte": cutoff})
+    ops = []
+    for ngo in users_collection.find(
+        {"_id": {"$in": [ObjectId(ngo_id) for ngo_id in sums if ObjectId.is_valid(ngo_id)]}},
+        {"donations_folded_through": 1}
+    ):
+        ngo_id = str(ngo["_id"])
+        folded_through = ngo.get("donations_folded_through")
+        if folded_through and folded_through >= cutoff:
+            continue
+        amount = sums[ngo_id]
+        if folded_through != low:
+            # Folded past the shared checkpoint by an earlier, partial run.
+            id_range = {"$gt": folded_through, "$lte": cutoff} if folded_through else {"$lte": cutoff}
+            amount = donation_sums(id_range, ngo_id).get(ngo_id, 0)
+        ops.append(UpdateOne(
+            {"_id": ngo["_id"], "donations_folded_through": folded_through},
+            {"$inc": {"amount_raised": amount}, "$set": {"donations_folded_through": cutoff}}
+        ))
+    if ops:
+        result = users_collection.bulk_write(ops, ordered=False)
+        if result.matched_count < len(ops):
+            # Another folder got there first; keep the checkpoint for the next run.
+            return result.modified_count
+    app_state_collection.update_one(
+        {"_id": "donation_fold"},
+        {"$max": {"folded_through": cutoff}},
+        upsert=True
+    )
+    return len(ops)
+
+def donation_sums(id_range, ngo_id=None):
+    match = {"_id": id_range}
+    if ngo_id:
+        match["ngo_id"] = ngo_id
+    rows = donations_collection.aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$ngo_id", "amount": {"$sum": "$amount"}}}
+    ])
+    return {row["_id"]: row["amount"] for row in rows}
+
+def run_donation_folder(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            fold_donations()
+        except Exception as e:
+            # Keep the job alive; the next run starts again from the checkpoint.
+            print("Donation fold failed:", e)
+
+background_jobs.append(("donation-folder", run_donation_folder, 'DONATION_FOLD_INTERVAL'))
+
+@app.cli.command("fold-donations")
+def fold_donations_command():
+    print(f"Folded donations for {fold_donations()} NGOs.")
+
 # ------------------------------
 # Organization Management
 # ------------------------------
@@ -339,7 +1804,7 @@ def org_manage_page():
     if session['role'] != 'organization':
         return "Access denied. Only organizations allowed."
     org_id = session['user_id']
-    org = organizations_collection.find_one({"_id": ObjectId(org_id)})
+    org = organizations_collection.find_one({"_id": ObjectId(org_id)}, {"org_name": 1, "email": 1})
     if not org:
         return "Organization not found."
     org = serialize_doc(org)
@@ -348,42 +1813,162 @@ def org_manage_page():
         positions_available = int(request.form.get('positions_available', 0))
         shelter_offered = int(request.form.get('shelter_offered', 0))
         food_offered = int(request.form.get('food_offered', 0))
-        new_event = {
-            "eventName": event_name,
-            "positions_available": positions_available,
-            "shelter_credits_offered": shelter_offered,
-            "food_credits_offered": food_offered
-        }
-        organizations_collection.update_one(
-            {"_id": ObjectId(org_id)},
-            {"$push": {"events": new_event}}
-        )
-        org = organizations_collection.find_one({"_id": ObjectId(org_id)})
-        org = serialize_doc(org)
-    return render_template('org_dashboard.html', org=org)
+        events_collection.insert_one(new_event_doc(
+            org_id, org.get("org_name", "Unnamed Organization"),
+            event_name, positions_available, shelter_offered, food_offered
+        ))
+        return redirect(url_for('org_manage_page'))
+    # Newest first, one page at a time; `before` is the last _id of the previous page.
+    query = {"org_id": org_id}
+    before = request.args.get('before')
+    if before and ObjectId.is_valid(before):
+        query["_id"] = {"$lt": ObjectId(before)}
+    events = OrgEventRow.find(events_collection, query, sort=[("_id", DESCENDING)], limit=ORG_EVENTS_PAGE_SIZE)
+    next_before = events[-1]._id if len(events) == ORG_EVENTS_PAGE_SIZE else None
+    weekly = analytics_report("org", org_id, *default_report_range(), period="week")
+    return render_template('org_dashboard.html', org=org, events=events, next_before=next_before, weekly=weekly)
 
 # ------------------------------
 # Opportunities
 # ------------------------------
+OPPORTUNITIES_PAGE_SIZE = 20
+OPPORTUNITY_CREDIT_TYPES = ["shelter", "food"]
+
+def parse_opportunity_filters(args):
+    """Read the search form (q, location, credit_type, from) into a
+    normalized dict; returns (filters, error)."""
+    filters = {
+        "q": " ".join(args.get("q", "").split()),
+        "location": args.get("location", "").strip().lower(),
+        "credit_type": args.get("credit_type", "").strip().lower(),
+        "from": args.get("from", "").strip(),
+        "after": args.get("after", "").strip(),
+    }
+    if filters["credit_type"] and filters["credit_type"] not in OPPORTUNITY_CREDIT_TYPES:
+        return None, f"Credit type must be one of {', '.join(OPPORTUNITY_CREDIT_TYPES)}"
+    if filters["from"]:
+        try:
+            datetime.strptime(filters["from"], "%Y-%m-%d")
+        except ValueError:
+            return None, "'from' must be a YYYY-MM-DD date"
+    return filters, None
+
+def opportunity_query(filters):
+    query = {}
+    if filters["q"]:
+        query["$text"] = {"$search": filters["q"]}
+    if filters["location"]:
+        query["location_key"] = filters["location"]
+    if filters["credit_type"]:
+        query["credit_type"] = filters["credit_type"]
+    if filters["from"]:
+        query["date"] = {"$gte": datetime.strptime(filters["from"], "%Y-%m-%d")}
+    return query
+
+def search_opportunities(filters):
+    """One page of opportunities as (rows, next_after).
+
+    Text searches are ordered by relevance, everything else newest first.
+    Both page by keyset: `after` is "<score>:<_id>" or "<_id>" of the last row
+    of the previous page, so deep pages cost the same as the first."""
+    query = opportunity_query(filters)
+    after = filters["after"]
+    if filters["q"]:
+        score, _, last_id = after.partition(":")
+        projection = dict(OpportunityRow.projection(), score={"$meta": "textScore"})
+        pipeline = [{"$match": query}, {"$project": projection}]
+        if after:
+            try:
+                score = float(score)
+            except ValueError:
+                score = None
+            if score is not None and ObjectId.is_valid(last_id):
+                pipeline.append({"$match": {"$or": [
+                    {"score": {"$lt": score}},
+                    {"score": score, "_id": {"$lt": ObjectId(last_id)}}
+                ]}})
+        pipeline += [{"$sort": {"score": -1, "_id": -1}}, {"$limit": OPPORTUNITIES_PAGE_SIZE + 1}]
+        docs = list(opportunities_collection.aggregate(pipeline))
+    else:
+        if after and ObjectId.is_valid(after):
+            query["_id"] = {"$lt": ObjectId(after)}
+        docs = list(opportunities_collection.find(query, OpportunityRow.projection())
+                    .sort("_id", DESCENDING).limit(OPPORTUNITIES_PAGE_SIZE + 1))
+    next_after = None
+    if len(docs) > OPPORTUNITIES_PAGE_SIZE:
+        docs = docs[:OPPORTUNITIES_PAGE_SIZE]
+        last = docs[-1]
+        next_after = f"{last['score']!r}:{last['_id']}" if filters["q"] else str(last["_id"])
+    return [OpportunityRow.from_doc(doc) for doc in docs], next_after
+
+opportunity_cache = RenderedPageCache(app.config['OPPORTUNITY_CACHE_SIZE'])
+for stat in ["hits", "misses"]:
+    metrics.registry.gauge(f"opportunity_cache_{stat}", f"Opportunity search cache {stat} since start.",
+                           lambda stat=stat: getattr(opportunity_cache, stat))
+
+def cached_opportunity_search(filters):
+    """search_opportunities() through a short-lived cache; popular searches
+    (and the unfiltered first page) are served without a query."""
+    key = (view_versions.etag("opportunities"), tuple(sorted(filters.items())))
+    page = opportunity_cache.get(key)
+    if page is None:
+        page = search_opportunities(filters)
+        opportunity_cache.put(key, page)
+    return page
+
+def opportunity_json(row):
+    data = row.as_dict()
+    data["date"] = row.date.strftime("%Y-%m-%d") if row.date else None
+    return data
+
 @app.route('/web/opportunities', methods=['GET'])
 def web_opportunities():
-    opps = list(opportunities_collection.find())
-    opps = [serialize_doc(o) for o in opps]
-    return render_template('opportunities.html', opportunities=opps)
+    filters, error = parse_opportunity_filters(request.args)
+    if error:
+        return error, 400
+
+    def render():
+        opps, next_after = cached_opportunity_search(filters)
+        return render_template('opportunities.html', opportunities=opps, filters=filters,
+                               next_after=next_after, credit_types=OPPORTUNITY_CREDIT_TYPES)
+    return cached_page(["opportunities"], ("anyone", tuple(sorted(filters.items())), 'user_id' in session), render)
 
 @app.route('/web/opportunities/create', methods=['POST'])
 @requires_login
 def web_opportunities_create():
-    title = request.form.get('title')
+    title = request.form.get('title', '').strip()
     description = request.form.get('description', '')
-    opp_data = {"title": title, "description": description}
+    location = request.form.get('location', '').strip()
+    credit_type = request.form.get('credit_type', '').strip().lower()
+    date = request.form.get('date', '').strip()
+    if not title:
+        return "Title is required.", 400
+    if credit_type and credit_type not in OPPORTUNITY_CREDIT_TYPES:
+        return f"Credit type must be one of {', '.join(OPPORTUNITY_CREDIT_TYPES)}.", 400
+    try:
+        date = datetime.strptime(date, "%Y-%m-%d") if date else None
+    except ValueError:
+        return "Date must be YYYY-MM-DD.", 400
+    opp_data = {
+        "title": title,
+        "description": description,
+        "date": date,
+        "location": location,
+        # Lower-cased copy for exact, indexed location filters.
+        "location_key": location.lower(),
+        "credit_type": credit_type,
+        "created_by": session['user_id'],
+        "created_at": datetime.now(timezone.utc)
+    }
     opportunities_collection.insert_one(opp_data)
+    view_versions.bump("opportunities")
     return redirect(url_for('web_opportunities'))
 
 @app.route('/web/opportunities/delete/<string:opp_id>', methods=['GET'])
 @requires_login
 def web_opportunities_delete(opp_id):
     opportunities_collection.delete_one({"_id": ObjectId(opp_id)})
+    view_versions.bump("opportunities")
     return redirect(url_for('web_opportunities'))
 
 # ------------------------------
@@ -396,36 +1981,65 @@ def homeless_redeem():
     if session['role'] != 'ngo':
         return "Access denied. Only NGOs can process redemption."
     if request.method == 'GET':
-        providers = list(providers_collection.find())
-        providers = [serialize_doc(p) for p in providers]
+        providers = provider_catalog.all()
         ngo_id = session['user_id']
-        homeless_list = list(users_collection.find({"role": "homeless person", "added_by": ngo_id}))
-        homeless_list = [serialize_doc(h) for h in homeless_list]
+        homeless_list = HomelessOption.find(users_collection, {"role": "homeless person", "added_by": ngo_id})
         return render_template('homeless_redeem.html', providers=providers, homeless_list=homeless_list)
     else:
         provider_id = request.form.get('provider_id')
-        redeem_amount = int(request.form.get('amount', 0))
         homeless_id = request.form.get('homeless_id')
-        homeless = users_collection.find_one({"_id": ObjectId(homeless_id)})
-        if not homeless:
+        try:
+            redeem_amount = int(request.form.get('amount', 0))
+        except ValueError:
+            return "Invalid amount.", 400
+        if redeem_amount <= 0:
+            return "Amount must be greater than zero.", 400
+        if not ObjectId.is_valid(homeless_id):
             return "Homeless record not found.", 404
-        provider = providers_collection.find_one({"_id": ObjectId(provider_id)})
+        provider = provider_catalog.get(provider_id)
         if not provider:
             return "Provider not found.", 404
-        provider_type = provider.get("provider_type", "").lower()
-        if provider_type == "shelter":
-            credit_type = "shelter"
-        elif provider_type == "food bank":
-            credit_type = "food"
-        else:
+        if (provider.provider_type or "").lower() not in PROVIDER_CREDIT_TYPES:
             return "Invalid provider type.", 400
-        current_credits = homeless.get(f"{credit_type}_credits", 0)
-        if current_credits < redeem_amount:
-            return "Not enough credits to redeem.", 400
-        users_collection.update_one({"_id": ObjectId(homeless_id)}, {"$inc": {f"{credit_type}_credits": -redeem_amount}})
-        providers_collection.update_one({"_id": ObjectId(provider_id)}, {"$inc": {"available_quota": -redeem_amount}})
+        try:
+            redeem_credits(homeless_id, provider, redeem_amount)
+        except RedemptionRejected as e:
+            return str(e), 400
+        view_versions.bump(f"ngo:{session['user_id']}")
         return redirect(url_for('homeless_redeem_confirmation'))
 
+def redeem_credits(homeless_id, provider, amount):
+    """Take `amount` credits from a homeless person and the provider's quota.
+
+    Both are decremented with guarded $inc, so neither can go negative. Inside
+    a transaction a rejection rolls back both; without one, the quota is
+    handed back explicitly. Raises RedemptionRejected with a user-facing message."""
+    credit_type, actor_role = PROVIDER_CREDIT_TYPES[provider.provider_type.lower()]
+    entry = ledger_entry(homeless_id, "redeem", credit_type, amount, actor_role, provider_id=provider._id)
+
+    def redeem(mongo_session):
+        updated = providers_collection.find_one_and_update(
+            {"_id": ObjectId(provider._id), "available_quota": {"$gte": amount}},
+            {"$inc": {"available_quota": -amount}},
+            projection={"available_quota": 1},
+            return_document=ReturnDocument.AFTER,
+            session=mongo_session
+        )
+        if not updated:
+            raise RedemptionRejected("Provider does not have enough quota left.")
+        success, result_val = post_ledger_entry(entry, mongo_session)
+        if not success:
+            if mongo_session is None:
+                providers_collection.update_one({"_id": ObjectId(provider._id)}, {"$inc": {"available_quota": amount}})
+            if result_val == "Insufficient credits":
+                raise RedemptionRejected("Not enough credits to redeem.")
+            raise RedemptionRejected(f"{result_val}.")
+        return updated["available_quota"]
+
+    quota = run_unit_of_work(redeem)
+    provider_catalog.update_quota(provider._id, quota)
+    return quota
+
 @app.route('/web/homeless/redeem/confirmation', methods=['GET'])
 @requires_login
 def homeless_redeem_confirmation():
@@ -434,22 +2048,6 @@ def homeless_redeem_confirmation():
 # ------------------------------
 # Gemini Chatbot Endpoints with Eat & Earn Context
 # ------------------------------
-def eat_and_earn_chat(user_question):
-    ngo_info = get_ngo_info()
-    background = f"""
-    You are the Eat & Earn assistant.
-    The Eat & Earn program awards credits to homeless people for volunteering and allows them to redeem these credits at credit-based food banks or shelters.
-    NGOs organize volunteering opportunities, and homeless people can earn credits by volunteering.
-    Current NGOs in the system: {ngo_info}.
-    Always answer in a helpful and structured way, referencing Eat & Earn processes.
-    """
-    full_prompt = f"{background}\nUser: {user_question}\nAssistant:"    
-    response = gemini_client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=full_prompt
-    )
-    return response.text
-
 @app.route('/web/gemini/chat', methods=['GET'])
 def gemini_chat_page():
     return render_template('gemini_chat.html')
@@ -460,62 +2058,1012 @@ def gemini_chat():
     prompt = data.get("prompt", "")
     if not prompt:
         return jsonify({"response": "No prompt provided"}), 400
-    answer = eat_and_earn_chat(prompt)
+    try:
+        answer = eat_and_earn_chat(prompt)
+    except LLMBusyError:
+        return jsonify({"response": "The assistant is busy, please try again shortly."}), 503
+    except FutureTimeoutError:
+        return jsonify({"response": "The assistant took too long to answer."}), 504
     return jsonify({"response": answer})
 
+def sse_event(data, event=None, event_id=None):
+    prefix = f"event: {event}\n" if event else ""
+    if event_id:
+        prefix += f"id: {event_id}\n"
+    return f"{prefix}data: {json.dumps(data, default=str)}\n\n"
+
+@app.route('/web/gemini/chat/stream', methods=['POST'])
+def gemini_chat_stream():
+    data = request.get_json(silent=True) or {}
+    prompt = data.get("prompt", "")
+    if not prompt:
+        return jsonify({"response": "No prompt provided"}), 400
+    try:
+        events = eat_and_earn_chat_stream(prompt)
+    except LLMBusyError:
+        return jsonify({"response": "The assistant is busy, please try again shortly."}), 503
+
+    def generate():
+        for kind, value in events:
+            if kind == "token":
+                yield sse_event({"token": value})
+            elif kind == "done":
+                yield sse_event({}, event="done")
+            else:
+                yield sse_event({"error": value}, event="error")
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    if isinstance(events, StreamedAnswer):
+        response.call_on_close(events.close)
+    return response
+
+# ------------------------------
+# Live dashboard updates
+# ------------------------------
+# Change stream error codes: no replica set, and a resume point that has
+# fallen off the oplog.
+CHANGE_STREAMS_UNSUPPORTED = 40573
+CHANGE_STREAM_HISTORY_LOST = 286
+
+LIVE_DOCUMENT_FIELDS = sorted(set(HomelessRow.FIELDS) | set(OrgEventRow.FIELDS) | {"role", "added_by", "org_id", "ngo_id", "amount"})
+
+# Only the changes some dashboard shows, and only the fields needed to route
+# and render them (never passwords).
+CHANGE_FEED_PIPELINE = [
+    {"$match": {
+        "operationType": {"$in": ["insert", "update", "replace"]},
+        "ns.coll": {"$in": ["users", "events", "donations"]},
+        "$or": [{"ns.coll": {"$ne": "users"}}, {"fullDocument.role": "homeless person"}]
+    }},
+    {"$project": dict(
+        {"operationType": 1, "ns": 1, "documentKey": 1, "updateDescription.updatedFields": 1},
+        **{f"fullDocument.{field}": 1 for field in LIVE_DOCUMENT_FIELDS}
+    )}
+]
+
+def route_change(change):
+    """Map a change event to (key, delta) pairs for the dashboards showing it.
+
+    Members go to the NGO that added them, events to the organization that
+    owns them, donations to the NGO they are for. Inserts carry every field a
+    row renders; updates only the changed ones."""
+    coll = change["ns"]["coll"]
+    doc = change.get("fullDocument") or {}
+    if coll == "donations":
+        if change["operationType"] != "insert":
+            return []
+        return [(f"ngo:{doc['ngo_id']}", {"kind": "donation", "amount": doc.get("amount", 0)})]
+    if coll == "users" and doc.get("added_by"):
+        key, kind, fields = f"ngo:{doc['added_by']}", "member", HomelessRow.FIELDS
+    elif coll == "events" and doc.get("org_id"):
+        key, kind, fields = f"org:{doc['org_id']}", "event", OrgEventRow.FIELDS
+    else:
+        return []
+    if change["operationType"] == "update":
+        updated = change["updateDescription"]["updatedFields"]
+        delta = {field: updated[field] for field in fields if field in updated and field != "_id"}
+        if not delta:
+            return []
+        op = "update"
+    else:
+        delta = {field: doc.get(field, default) for field, default in fields.items() if field != "_id"}
+        op = "insert"
+    return [(key, {"kind": kind, "op": op, "id": str(change["documentKey"]["_id"]), "fields": delta})]
+
+class LiveSubscriber:
+    __slots__ = ("key", "queue", "closed", "after")
+
+    def __init__(self, key, queue_size, after=None):
+        self.key = key
+        self.queue = queue.Queue(maxsize=queue_size)
+        # None while live, else the event the browser gets before the stream ends.
+        self.closed = None
+        # The browser already has every change up to this token.
+        self.after = after
+
+class ChangeFeed:
+    """One change stream per process, fanned out to dashboard subscribers by key.
+
+    The stream runs while anyone is subscribed and resumes from its last token
+    after errors, and after idle spells shorter than resume_seconds, so the
+    recent deltas it keeps have no holes. A browser reconnecting with
+    Last-Event-ID gets the ones newer than that token. Resume tokens are the
+    same on every node and worker and their _data strings sort in cluster
+    time order, so a token this process never saw (another worker's, or one
+    from before it started watching) just means "from here on". Only a token
+    older than a gap this process knows of (an overflowed buffer or lost
+    stream history) makes the browser reload."""
+
+    def __init__(self, replay_size, queue_size, max_subscribers, resume_seconds):
+        self.replay_size = replay_size
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.resume_seconds = resume_seconds
+        self.available = True
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._subscribers = {}
+        self._count = 0
+        self._recent = deque(maxlen=self.replay_size)
+        # Deltas older than the oldest kept one were dropped or never seen.
+        self._gap = False
+        self._resume_token = None
+        self._stopped_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, key, last_event_id=None):
+        """Return the new subscriber and the deltas it missed since
+        last_event_id, or None for missed when some may be lost.
+        The subscriber is None when this process is already at its limit."""
+        subscriber = LiveSubscriber(key, self.queue_size, last_event_id or None)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None, None
+            if self._thread is None:
+                self._forget_if_stale()
+            missed = []
+            if last_event_id:
+                if self._gap and (not self._recent or last_event_id < self._recent[0][0]):
+                    missed = None
+                else:
+                    missed = [(token, delta) for token, k, delta in self._recent
+                              if k == key and token > last_event_id]
+            self._subscribers.setdefault(key, set()).add(subscriber)
+            self._count += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+                self._thread.start()
+        return subscriber, missed
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.key)
+            if subscribers and subscriber in subscribers:
+                subscribers.discard(subscriber)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscriber.key]
+
+    def publish(self, token, key, delta):
+        with self._lock:
+            if len(self._recent) == self._recent.maxlen:
+                self._gap = True
+            self._recent.append((token, key, delta))
+            for subscriber in self._subscribers.get(key, ()):
+                if subscriber.after and token <= subscriber.after:
+                    continue
+                try:
+                    subscriber.queue.put_nowait((token, delta))
+                except queue.Full:
+                    subscriber.closed = "reset"
+
+    def _close_all(self, event):
+        with self._lock:
+            self._recent.clear()
+            self._gap = True
+            for subscribers in self._subscribers.values():
+                for subscriber in subscribers:
+                    subscriber.closed = event
+                    try:
+                        subscriber.queue.put_nowait(None)
+                    except queue.Full:
+                        pass
+
+    def detach(self, subscriber):
+        """Unsubscribe and return the deltas still queued for the subscriber
+        plus the latest token seen, which is at or past every one of them."""
+        self.unsubscribe(subscriber)
+        with self._lock:
+            pending = []
+            while not subscriber.queue.empty():
+                item = subscriber.queue.get_nowait()
+                if item is not None:
+                    pending.append(item)
+            return pending, self._recent[-1][0] if self._recent else None
+
+    def _forget_if_stale(self):
+        """Before restarting the watcher: after a long idle spell, start from
+        now and forget the deltas kept from before. Called with the lock held."""
+        if self._stopped_at is not None and time.monotonic() - self._stopped_at > self.resume_seconds:
+            self._recent.clear()
+            self._gap = False
+            self._resume_token = None
+        self._stopped_at = None
+
+    def _idle(self):
+        """Stop the watcher (returning True) once nobody is subscribed."""
+        with self._lock:
+            if self._subscribers:
+                return False
+            self._thread = None
+            self._stopped_at = time.monotonic()
+            return True
+
+    def _run(self):
+        while not self._idle():
+            try:
+                with db.watch(CHANGE_FEED_PIPELINE, full_document="updateLookup",
+                              resume_after=self._resume_token, max_await_time_ms=1000) as stream:
+                    while True:
+                        change = stream.try_next()
+                        if change is None:
+                            if self._idle():
+                                return
+                            continue
+                        self._resume_token = change["_id"]
+                        token = change["_id"]["_data"]
+                        try:
+                            routed = route_change(change)
+                        except Exception as e:
+                            # One malformed document must not stop the feed.
+                            print("Skipping change", token, e)
+                            continue
+                        for key, delta in routed:
+                            self.publish(token, key, delta)
+            except errors.OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    print("Live updates disabled:", e)
+                    self.available = False
+                    self._close_all("unavailable")
+                    with self._lock:
+                        self._thread = None
+                    return
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    self._resume_token = None
+                    self._close_all("reset")
+                print("Change feed failed:", e)
+                time.sleep(1)
+            except Exception as e:
+                print("Change feed failed:", e)
+                time.sleep(1)
+
+change_feed = ChangeFeed(app.config['LIVE_REPLAY_SIZE'], app.config['LIVE_QUEUE_SIZE'],
+                         app.config['LIVE_MAX_SUBSCRIBERS'], app.config['LIVE_RESUME_SECONDS'])
+
+@app.route('/web/live', methods=['GET'])
+@requires_login
+def live_updates():
+    """Server-sent deltas for the signed-in NGO's or organization's dashboard."""
+    if session['role'] == 'ngo':
+        key = f"ngo:{session['user_id']}"
+    elif session['role'] == 'organization':
+        key = f"org:{session['user_id']}"
+    else:
+        return "Access denied. Only NGOs and organizations allowed.", 403
+    if not app.config['LIVE_UPDATES'] or not change_feed.available:
+        # 204 tells EventSource to stop reconnecting; the page still works.
+        return "", 204
+    subscriber, missed = change_feed.subscribe(key, request.headers.get("Last-Event-ID"))
+    if subscriber is None:
+        return "", 204
+    keepalive = app.config['LIVE_KEEPALIVE']
+    deadline = time.monotonic() + app.config['LIVE_STREAM_SECONDS']
+
+    def generate():
+        try:
+            if missed is None:
+                yield sse_event({}, event="reset")
+                return
+            for token, delta in missed:
+                yield sse_event(delta, event_id=token)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # End the stream to free the thread. An id-only event moves
+                    # the browser's Last-Event-ID up to the latest change, so
+                    # its reconnect only replays what happens after this point.
+                    pending, latest = change_feed.detach(subscriber)
+                    if subscriber.closed:
+                        yield sse_event({}, event=subscriber.closed)
+                        return
+                    for token, delta in pending:
+                        yield sse_event(delta, event_id=token)
+                    if latest:
+                        yield f"id: {latest}\n\n"
+                    return
+                try:
+                    item = subscriber.queue.get(timeout=min(keepalive, remaining))
+                except queue.Empty:
+                    # Keeps proxies from timing out and notices closed connections.
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None or subscriber.closed:
+                    yield sse_event({}, event=subscriber.closed or "reset")
+                    return
+                token, delta = item
+                yield sse_event(delta, event_id=token)
+        finally:
+            change_feed.unsubscribe(subscriber)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ------------------------------
 # Transaction Logic
 # ------------------------------
-def update_user_credits(user_id, amount, txn_type, credit_type):
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        return False, "User not found"
-    if user.get("role", "").strip().lower() != "homeless person":
-        return False, "Transactions can only be applied to homeless persons"
+TRANSACTIONS_DEFAULT_LIMIT = 100
+TRANSACTIONS_MAX_LIMIT = 1000
+TRANSACTIONS_STREAM_BATCH_SIZE = 500
+
+def parse_timestamp(value):
+    # Accepts ISO-8601 strings or unix seconds; naive values are treated as UTC.
+    try:
+        parsed = datetime.fromtimestamp(float(value), tz=timezone.utc)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def build_transaction_query(args):
+    """Translate request args into a Mongo filter on the transactions collection.
+
+    Pagination and time ranges both work on `_id`, so every page is an index
+    range scan instead of a skip over earlier documents."""
+    query = {}
+    for field in ["user", "type", "credit_type"]:
+        if args.get(field):
+            query[field] = args[field]
+    id_range = {}
+    after = args.get("after")
+    if after:
+        if not ObjectId.is_valid(after):
+            return None, "Invalid 'after' cursor"
+        id_range["$gt"] = ObjectId(after)
+    try:
+        if args.get("since"):
+            since_id = ObjectId.from_datetime(parse_timestamp(args["since"]))
+            if "$gt" not in id_range or id_range["$gt"] < since_id:
+                id_range = {"$gte": since_id}
+        if args.get("until"):
+            id_range["$lt"] = ObjectId.from_datetime(parse_timestamp(args["until"]))
+    except (ValueError, OverflowError, OSError, struct.error):
+        # ObjectId timestamps only cover 1970-2106 (struct.error outside it).
+        return None, "Invalid 'since' or 'until' timestamp"
+    if id_range:
+        query["_id"] = id_range
+    return query, None
+
+def stream_transactions(query):
+    cursor = transactions_collection.find(query).sort("_id", 1).batch_size(TRANSACTIONS_STREAM_BATCH_SIZE)
+    try:
+        for txn in cursor:
+            yield json.dumps(serialize_doc(txn), default=str) + "\n"
+    finally:
+        cursor.close()
+
+TRANSACTIONS_BULK_CHUNK_SIZE = 1000
+
+def validate_transaction(data):
+    """Request-level checks shared by the single and bulk transaction endpoints.
+
+    Returns an error message, or None if the transaction may be applied."""
+    if not isinstance(data, dict):
+        return "Transaction must be a JSON object"
+    if "_id" in data:
+        return "Transaction ids are assigned by the server"
+    required_fields = ["user", "type", "amount", "credit_type", "actor_role"]
+    for field in required_fields:
+        if field not in data:
+            return f"Missing field: {field}"
+    try:
+        amount = int(data["amount"])
+    except (TypeError, ValueError):
+        return "Amount must be an integer"
+    if amount <= 0:
+        return "Amount must be greater than zero"
+    if not ObjectId.is_valid(data["user"]):
+        return "User not found"
+    if data["credit_type"] not in ["shelter", "food"]:
+        return "Invalid credit type. Must be 'shelter' or 'food'."
+    txn_type = data["type"]
+    actor_role = str(data["actor_role"]).strip().lower()
+    if txn_type == "earn" and actor_role != "volunteering workplace":
+        return "Only volunteering workplace can trigger earn transactions"
+    if txn_type == "redeem" and actor_role not in ["credit based food bank", "credit based shelter"]:
+        return "Only credit based food banks or shelters can trigger redeem transactions"
+    if txn_type not in ["earn", "redeem"]:
+        return "Invalid transaction type"
+    return None
+
+# Optional client fields copied into the ledger; anything else is dropped.
+TRANSACTION_OPTIONAL_FIELDS = ["note", "org_id", "provider_id"]
+
+def transaction_entry(data):
+    """Build the ledger document for a validated API transaction."""
+    extra = {field: data[field] for field in TRANSACTION_OPTIONAL_FIELDS if isinstance(data.get(field), str)}
+    return ledger_entry(data["user"], data["type"], data["credit_type"], int(data["amount"]),
+                        data["actor_role"], **extra)
+
+def parse_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+def apply_transaction_batch(items, offset=0):
+    """Validate and apply a batch of transactions with one read and two bulk writes.
+
+    Items are checked in order against balances read up front, then each user's
+    net change is applied as a single guarded $inc. Returns one result per item."""
+    results = [None] * len(items)
+    pending = []
+    for i, item in enumerate(items):
+        error = validate_transaction(item)
+        if error:
+            results[i] = {"index": offset + i, "status": 400, "error": error}
+        else:
+            pending.append(i)
+    user_ids = {ObjectId(items[i]["user"]) for i in pending}
+    users = {
+        str(u["_id"]): u for u in users_collection.find(
+            {"_id": {"$in": list(user_ids)}},
+            {"role": 1, "shelter_credits": 1, "food_credits": 1}
+        )
+    }
+    balances = {}
+    deltas = {}
+    accepted = []
+    for i in pending:
+        item = items[i]
+        user = users.get(item["user"])
+        if not user:
+            results[i] = {"index": offset + i, "status": 400, "error": "User not found"}
+            continue
+        if user.get("role", "").strip().lower() != "homeless person":
+            results[i] = {"index": offset + i, "status": 400, "error": "Transactions can only be applied to homeless persons"}
+            continue
+        field = f"{item['credit_type']}_credits"
+        key = (item["user"], field)
+        balance = balances.get(key, user.get(field, 0))
+        amount = int(item["amount"])
+        if item["type"] == "redeem":
+            if balance < amount:
+                results[i] = {"index": offset + i, "status": 400, "error": "Insufficient credits"}
+                continue
+            amount = -amount
+        balances[key] = balance + amount
+        deltas.setdefault(item["user"], {}).setdefault(field, 0)
+        deltas[item["user"]][field] += amount
+        accepted.append(i)
+    if deltas:
+        run_unit_of_work(lambda mongo_session: write_transaction_batch(items, accepted, deltas, results, offset, mongo_session))
+    return results
+
+def write_transaction_batch(items, accepted, deltas, results, offset, session=None):
+    # The batch marker tells us which users were updated if a guard fails
+    # because a balance moved between the read and this write.
+    batch_id = ObjectId()
+    ops = []
+    for user_id, fields in deltas.items():
+        guard = {"_id": ObjectId(user_id), "role": "homeless person"}
+        for field, delta in fields.items():
+            if delta < 0:
+                guard[field] = {"$gte": -delta}
+        ops.append(UpdateOne(guard, {"$inc": fields, "$set": {"last_txn_batch": batch_id}}))
+    result = users_collection.bulk_write(ops, ordered=False, session=session)
+    applied = set(deltas)
+    if result.matched_count < len(ops):
+        applied = {
+            str(u["_id"]) for u in users_collection.find(
+                {"_id": {"$in": [ObjectId(uid) for uid in deltas]}, "last_txn_batch": batch_id},
+                {"_id": 1},
+                session=session
+            )
+        }
+    entries = {}
+    for i in accepted:
+        if items[i]["user"] in applied:
+            entries[i] = transaction_entry(items[i])
+        else:
+            results[i] = {"index": offset + i, "status": 409, "error": "Balance changed during upload, retry this item"}
+    if entries:
+        transactions_collection.insert_many(list(entries.values()), ordered=False, session=session)
+    for i, entry in entries.items():
+        results[i] = {"index": offset + i, "status": 201, "_id": str(entry["_id"])}
+
+def update_user_credits(user_id, amount, txn_type, credit_type, session=None):
+    """Apply one balance change with a guarded $inc.
+
+    Redeems only match while the balance covers them, so concurrent redeems
+    cannot overdraw. The failure reason is looked up only when the update misses."""
     if credit_type not in ["shelter", "food"]:
         return False, "Invalid credit type. Must be 'shelter' or 'food'."
     field = f"{credit_type}_credits"
-    current_credits = user.get(field, 0)
+    guard = {"_id": ObjectId(user_id), "role": "homeless person"}
     if txn_type == "earn":
-        new_balance = current_credits + amount
+        delta = amount
     elif txn_type == "redeem":
-        if current_credits < amount:
-            return False, "Insufficient credits"
-        new_balance = current_credits - amount
+        guard[field] = {"$gte": amount}
+        delta = -amount
     else:
         return False, "Invalid transaction type"
-    users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {field: new_balance}})
-    return True, new_balance
+    user = users_collection.find_one_and_update(
+        guard,
+        {"$inc": {field: delta}},
+        projection={field: 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if user:
+        return True, user[field]
+    user = users_collection.find_one({"_id": ObjectId(user_id)}, {"role": 1}, session=session)
+    if not user:
+        return False, "User not found"
+    if user.get("role", "").strip().lower() != "homeless person":
+        return False, "Transactions can only be applied to homeless persons"
+    return False, "Insufficient credits"
+
+def ledger_entry(user_id, txn_type, credit_type, amount, actor_role, **extra):
+    entry = {"user": user_id, "type": txn_type, "amount": amount, "credit_type": credit_type, "actor_role": actor_role}
+    entry.update(extra)
+    entry["created_at"] = datetime.now(timezone.utc)
+    return entry
+
+def opening_balance_entries(user_id, shelter_credits, food_credits):
+    return [
+        ledger_entry(user_id, "earn", credit_type, amount, "ngo", note="opening balance")
+        for credit_type, amount in [("shelter", shelter_credits), ("food", food_credits)] if amount > 0
+    ]
+
+def post_ledger_entry(entry, session=None):
+    """Apply a transaction's balance change and append it to the ledger."""
+    success, result_val = update_user_credits(entry["user"], entry["amount"], entry["type"], entry["credit_type"], session=session)
+    if success:
+        entry["created_at"] = datetime.now(timezone.utc)
+        transactions_collection.insert_one(entry, session=session)
+    return success, result_val
+
+def record_transaction(entry):
+    return run_unit_of_work(lambda mongo_session: post_ledger_entry(entry, mongo_session))
+
+# ------------------------------
+# Ledger snapshots and reconciliation
+# ------------------------------
+LEDGER_BATCH_SIZE = 500
+
+def ledger_balances(user_ids, until_id=None, session=None):
+    """Rebuild balances for a batch of users from their latest snapshot plus
+    the ledger entries recorded after it (up to until_id, if given)."""
+    # Only each user's newest snapshot is read, however many have accumulated.
+    snapshots = {
+        row["_id"]: row["snapshot"] for row in balance_snapshots_collection.aggregate([
+            {"$match": {"user": {"$in": user_ids}}},
+            {"$sort": {"user": -1, "_id": -1}},
+            {"$group": {"_id": "$user", "snapshot": {"$first": "$$ROOT"}}}
+        ], session=session)
+    }
+    balances = {}
+    branches = []
+    for user_id in user_ids:
+        snap = snapshots.get(user_id, {})
+        balances[user_id] = {
+            "shelter_credits": snap.get("shelter_credits", 0),
+            "food_credits": snap.get("food_credits", 0),
+            "last_txn_id": snap.get("last_txn_id"),
+            "snapshot_txn_id": snap.get("last_txn_id")
+        }
+        id_range = {}
+        if snap.get("last_txn_id"):
+            id_range["$gt"] = snap["last_txn_id"]
+        if until_id:
+            id_range["$lte"] = until_id
+        branches.append({"user": user_id, "_id": id_range} if id_range else {"user": user_id})
+    if not branches:
+        return balances
+    signed_amount = {"$cond": [
+        {"$eq": ["$type", "redeem"]},
+        {"$multiply": [-1, {"$toInt": "$amount"}]},
+        {"$toInt": "$amount"}
+    ]}
+    pipeline = [
+        {"$match": {"$or": branches}},
+        {"$group": {
+            "_id": {"user": "$user", "credit_type": "$credit_type"},
+            "delta": {"$sum": signed_amount},
+            "last_txn_id": {"$max": "$_id"}
+        }}
+    ]
+    for row in transactions_collection.aggregate(pipeline, session=session):
+        balance = balances[row["_id"]["user"]]
+        balance[f"{row['_id']['credit_type']}_credits"] += row["delta"]
+        if balance["last_txn_id"] is None or row["last_txn_id"] > balance["last_txn_id"]:
+            balance["last_txn_id"] = row["last_txn_id"]
+    return balances
+
+def rebuild_user_balance(user_id):
+    balance = ledger_balances([user_id])[user_id]
+    del balance["snapshot_txn_id"]
+    return balance
+
+def iter_homeless_batches(batch_size=LEDGER_BATCH_SIZE):
+    cursor = users_collection.find(
+        {"role": "homeless person"},
+        {"shelter_credits": 1, "food_credits": 1}
+    ).sort("_id", 1).batch_size(batch_size)
+    batch = []
+    for user in cursor:
+        batch.append(user)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def snapshot_balances(batch_size=LEDGER_BATCH_SIZE):
+    """Fold every homeless person's ledger entries older than
+    LEDGER_SNAPSHOT_LAG into a new snapshot."""
+    cutoff = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=app.config['LEDGER_SNAPSHOT_LAG']))
+    newest = transactions_collection.find_one({"_id": {"$lt": cutoff}}, {"_id": 1}, sort=[("_id", -1)])
+    if not newest:
+        return 0
+    written = 0
+    for batch in iter_homeless_batches(batch_size):
+        user_ids = [str(u["_id"]) for u in batch]
+        now = datetime.now(timezone.utc)
+        snapshots = []
+        for user_id, balance in ledger_balances(user_ids, until_id=newest["_id"]).items():
+            # Users with no ledger activity since their last snapshot are skipped.
+            if balance.pop("snapshot_txn_id") != balance["last_txn_id"]:
+                snapshots.append(dict(balance, user=user_id, created_at=now))
+        if snapshots:
+            balance_snapshots_collection.insert_many(snapshots)
+            written += len(snapshots)
+    return written
+
+def reconcile_balances(batch_size=LEDGER_BATCH_SIZE):
+    """Yield every homeless person whose materialized balance differs from the ledger."""
+    for batch in iter_homeless_batches(batch_size):
+        rebuilt = ledger_balances([str(u["_id"]) for u in batch])
+        for user in batch:
+            expected = rebuilt[str(user["_id"])]
+            for field in ["shelter_credits", "food_credits"]:
+                if user.get(field, 0) != expected[field]:
+                    yield {"user": str(user["_id"]), "field": field,
+                           "materialized": user.get(field, 0), "ledger": expected[field]}
+
+def backfill_opening_batch(user_ids, session=None):
+    users = list(users_collection.find(
+        {"_id": {"$in": user_ids}, "role": "homeless person"},
+        {"shelter_credits": 1, "food_credits": 1},
+        session=session
+    ))
+    rebuilt = ledger_balances([str(u["_id"]) for u in users], session=session)
+    opening = []
+    for user in users:
+        user_id = str(user["_id"])
+        for credit_type in ["shelter", "food"]:
+            field = f"{credit_type}_credits"
+            # Credits granted or spent before the ledger existed.
+            missing = user.get(field, 0) - rebuilt[user_id][field]
+            if missing:
+                opening.append(ledger_entry(
+                    user_id, "earn" if missing > 0 else "redeem", credit_type, abs(missing), "ngo",
+                    note="opening balance", opening=f"{user_id}:{credit_type}"
+                ))
+    if opening:
+        transactions_collection.insert_many(opening, ordered=False, session=session)
+    return len(opening)
+
+def backfill_opening_balances(batch_size=LEDGER_BATCH_SIZE):
+    """Post an opening entry for the part of each homeless person's balance
+    the ledger does not account for: credits granted or redeemed before the
+    ledger existed. The unique `opening` key allows one per user and credit
+    type, so re-running (or racing another process) posts nothing twice.
+    Balances must not change while it runs unless MONGO_TRANSACTIONS is on."""
+    posted = 0
+    for batch in iter_homeless_batches(batch_size):
+        user_ids = [u["_id"] for u in batch]
+        try:
+            posted += run_unit_of_work(lambda mongo_session: backfill_opening_batch(user_ids, mongo_session))
+        except errors.BulkWriteError as e:
+            # Another process posted some of these first. Outside a transaction
+            # the rest still landed; inside one, that process posted the batch.
+            if not app.config['MONGO_TRANSACTIONS']:
+                posted += e.details.get("nInserted", 0)
+    return posted
+
+@app.cli.command("backfill-opening-balances")
+def backfill_opening_balances_command():
+    print(f"Posted {backfill_opening_balances()} opening balance entries.")
+
+@app.cli.command("snapshot-balances")
+def snapshot_balances_command():
+    print(f"Wrote {snapshot_balances()} balance snapshots.")
+
+@app.cli.command("reconcile-balances")
+def reconcile_balances_command():
+    mismatches = 0
+    for mismatch in reconcile_balances():
+        mismatches += 1
+        print(json.dumps(mismatch))
+    print(f"{mismatches} mismatched balances.")
+    if mismatches:
+        raise SystemExit(1)
+
+# ------------------------------
+# Analytics rollups
+# ------------------------------
+# The ledger is rolled up into one document per (day, scope, scope_id,
+# credit_type), so a report over N days reads at most N documents per credit
+# type. Scopes are "ngo" (the NGO that added the person), "org" (the
+# organization whose event awarded the credits), "provider" (where credits were
+# redeemed) and "all". A background job works through the ledger in _id order
+# from a checkpoint; reports therefore trail writes by up to
+# ANALYTICS_ROLLUP_INTERVAL + ANALYTICS_ROLLUP_LAG seconds.
+ANALYTICS_BATCH_SIZE = 5000
+ANALYTICS_SCOPES = ["ngo", "org", "provider", "all"]
+ANALYTICS_DEFAULT_DAYS = 56
+ANALYTICS_TOTALS = ["earned", "redeemed", "earn_count", "redeem_count"]
+
+def rollup_scopes(txn, ngo_by_user):
+    scopes = [("all", "all")]
+    if ngo_by_user.get(txn.get("user")):
+        scopes.append(("ngo", ngo_by_user[txn["user"]]))
+    if txn.get("org_id"):
+        scopes.append(("org", txn["org_id"]))
+    if txn.get("provider_id"):
+        scopes.append(("provider", txn["provider_id"]))
+    return scopes
+
+def rollup_deltas(txns):
+    """Sum a batch of ledger entries into {(day, scope, scope_id, credit_type): totals}."""
+    user_ids = [ObjectId(t["user"]) for t in txns if ObjectId.is_valid(t.get("user"))]
+    ngo_by_user = {
+        str(u["_id"]): u.get("added_by")
+        for u in users_collection.find({"_id": {"$in": user_ids}}, {"added_by": 1})
+    }
+    deltas = {}
+    for txn in txns:
+        if txn.get("type") not in ["earn", "redeem"] or txn.get("credit_type") not in ["shelter", "food"]:
+            continue
+        try:
+            amount = int(txn.get("amount", 0))
+        except (TypeError, ValueError):
+            # Legacy entries with non-numeric amounts carry no credits to report.
+            continue
+        day = txn["_id"].generation_time.strftime("%Y-%m-%d")
+        for scope, scope_id in rollup_scopes(txn, ngo_by_user):
+            totals = deltas.setdefault((day, scope, str(scope_id), txn["credit_type"]), dict.fromkeys(ANALYTICS_TOTALS, 0))
+            if txn["type"] == "earn":
+                totals["earned"] += amount
+                totals["earn_count"] += 1
+            else:
+                totals["redeemed"] += amount
+                totals["redeem_count"] += 1
+    return deltas
+
+def apply_rollup_deltas(deltas, high):
+    """Add a batch's totals to the rollup documents exactly once.
+
+    Each document records the last ledger _id folded into it (`through`) and is
+    only incremented while that is below the batch's high mark, so a batch
+    repeated after a crash or by a second worker adds nothing."""
+    keys = {key: "|".join(key) for key in deltas}
+    try:
+        analytics_collection.bulk_write([
+            UpdateOne({"_id": doc_id}, {"$setOnInsert": {
+                "day": key[0], "scope": key[1], "scope_id": key[2], "credit_type": key[3], "through": None
+            }}, upsert=True)
+            for key, doc_id in keys.items()
+        ], ordered=False)
+    except errors.BulkWriteError as e:
+        # Two workers creating the same document race on the upsert; either copy will do.
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+    analytics_collection.bulk_write([
+        UpdateOne(
+            {"_id": doc_id, "$or": [{"through": None}, {"through": {"$lt": high}}]},
+            {"$inc": deltas[key], "$set": {"through": high}}
+        )
+        for key, doc_id in keys.items()
+    ], ordered=False)
+
+def roll_up_range(low, high):
+    """Apply the ledger entries in (low, high] to the rollup documents and
+    advance the checkpoint to high. Returns the number of entries."""
+    id_range = {"$gt": low, "$lte": high} if low else {"$lte": high}
+    txns = list(transactions_collection.find(
+        {"_id": id_range},
+        {"user": 1, "type": 1, "credit_type": 1, "amount": 1, "org_id": 1, "provider_id": 1}
+    ))
+    deltas = rollup_deltas(txns)
+    if deltas:
+        apply_rollup_deltas(deltas, high)
+    app_state_collection.update_one(
+        {"_id": "analytics_rollup"},
+        {"$max": {"rolled_up_through": high}, "$unset": {"pending": ""}},
+        upsert=True
+    )
+    return len(txns)
+
+def roll_up_transactions(batch_size=ANALYTICS_BATCH_SIZE):
+    """Roll ledger entries older than ANALYTICS_ROLLUP_LAG into the daily documents.
+
+    Only the process holding the "analytics_rollup" lease runs; others return
+    0. Each batch's (low, high] range is recorded in app_state before it is
+    applied, and a run first replays any recorded range. The replay reuses
+    the batch's own high mark, so the `through` guard in
+    apply_rollup_deltas() skips the documents the interrupted run already
+    updated. Returns the number of ledger entries processed."""
+    lease_seconds = app.config['ANALYTICS_ROLLUP_LEASE']
+    if not acquire_lease("analytics_rollup", lease_seconds):
+        return 0
+    try:
+        state = app_state_collection.find_one({"_id": "analytics_rollup"}) or {}
+        processed = 0
+        pending = state.get("pending")
+        if pending:
+            processed += roll_up_range(pending.get("low"), pending["high"])
+        low = pending["high"] if pending else state.get("rolled_up_through")
+        cutoff = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=app.config['ANALYTICS_ROLLUP_LAG']))
+        while True:
+            id_range = {"$gt": low, "$lte": cutoff} if low else {"$lte": cutoff}
+            last = list(transactions_collection.find({"_id": id_range}, {"_id": 1})
+                        .sort("_id", 1).skip(batch_size - 1).limit(1))
+            if not last:
+                last = list(transactions_collection.find({"_id": id_range}, {"_id": 1}).sort("_id", -1).limit(1))
+            if not last:
+                break
+            high = last[0]["_id"]
+            app_state_collection.update_one(
+                {"_id": "analytics_rollup"},
+                {"$set": {"pending": {"low": low, "high": high}}},
+                upsert=True
+            )
+            processed += roll_up_range(low, high)
+            low = high
+            if not acquire_lease("analytics_rollup", lease_seconds):
+                break
+        if processed:
+            view_versions.bump("analytics")
+        return processed
+    finally:
+        release_lease("analytics_rollup")
+
+def run_analytics_rollup(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            roll_up_transactions()
+        except Exception as e:
+            # Keep the job alive; the pending range is retried on the next run.
+            print("Analytics rollup failed:", e)
+
+background_jobs.append(("analytics-rollup", run_analytics_rollup, 'ANALYTICS_ROLLUP_INTERVAL'))
+
+@app.cli.command("roll-up-analytics")
+def roll_up_analytics_command():
+    print(f"Rolled up {roll_up_transactions()} transactions.")
+
+def period_start(day, period):
+    if period == "week":
+        date = datetime.strptime(day, "%Y-%m-%d")
+        return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+    return day
+
+def analytics_report(scope, scope_id, since, until, period="day"):
+    """Totals per period and credit type for one scope between two YYYY-MM-DD days (inclusive)."""
+    rows = {}
+    for doc in analytics_collection.find(
+        {"scope": scope, "scope_id": scope_id, "day": {"$gte": since, "$lte": until}},
+        {"day": 1, "credit_type": 1, **dict.fromkeys(ANALYTICS_TOTALS, 1)}
+    ):
+        key = (period_start(doc["day"], period), doc["credit_type"])
+        totals = rows.setdefault(key, dict.fromkeys(ANALYTICS_TOTALS, 0))
+        for field in ANALYTICS_TOTALS:
+            totals[field] += doc.get(field, 0)
+    return [dict(totals, period=key[0], credit_type=key[1]) for key, totals in sorted(rows.items())]
+
+def default_report_range(days=ANALYTICS_DEFAULT_DAYS):
+    today = datetime.now(timezone.utc)
+    return (today - timedelta(days=days - 1)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
+
+class OpportunitySearch(Resource):
+    def get(self):
+        filters, error = parse_opportunity_filters(request.args)
+        if error:
+            return {"error": error}, 400
+        opps, next_after = cached_opportunity_search(filters)
+        return {"opportunities": [opportunity_json(o) for o in opps], "next_after": next_after}
+
+class AnalyticsReport(Resource):
+    def get(self, scope, scope_id):
+        if scope not in ANALYTICS_SCOPES:
+            return {"error": f"Scope must be one of {', '.join(ANALYTICS_SCOPES)}"}, 400
+        period = request.args.get("period", "day")
+        if period not in ["day", "week"]:
+            return {"error": "Period must be 'day' or 'week'"}, 400
+        since, until = default_report_range()
+        since = request.args.get("since", since)
+        until = request.args.get("until", until)
+        try:
+            datetime.strptime(since, "%Y-%m-%d")
+            datetime.strptime(until, "%Y-%m-%d")
+        except ValueError:
+            return {"error": "'since' and 'until' must be YYYY-MM-DD dates"}, 400
+        state = app_state_collection.find_one({"_id": "analytics_rollup"}) or {}
+        through = state.get("rolled_up_through")
+        return {
+            "scope": scope,
+            "scope_id": scope_id,
+            "period": period,
+            "since": since,
+            "until": until,
+            "rolled_up_through": through.generation_time.isoformat() if through else None,
+            "rows": analytics_report(scope, scope_id, since, until, period)
+        }
 
 class TransactionList(Resource):
     def get(self):
-        txns = list(transactions_collection.find())
-        return jsonify([serialize_doc(txn) for txn in txns])
+        query, error = build_transaction_query(request.args)
+        if error:
+            return {"error": error}, 400
+        wants_ndjson = (request.args.get("format") == "ndjson"
+                        or request.accept_mimetypes.best == "application/x-ndjson")
+        if wants_ndjson:
+            # Documents are written out as the cursor yields them, so memory stays flat.
+            return Response(stream_with_context(stream_transactions(query)), mimetype="application/x-ndjson")
+        try:
+            limit = int(request.args.get("limit", TRANSACTIONS_DEFAULT_LIMIT))
+        except ValueError:
+            return {"error": "Limit must be an integer"}, 400
+        if limit <= 0:
+            return {"error": "Limit must be greater than zero"}, 400
+        limit = min(limit, TRANSACTIONS_MAX_LIMIT)
+        txns = list(transactions_collection.find(query).sort("_id", 1).limit(limit))
+        next_after = str(txns[-1]["_id"]) if len(txns) == limit else None
+        txns = [serialize_doc(txn) for txn in txns]
+        return jsonify({"transactions": txns, "next_after": next_after})
     
     def post(self):
         data = request.get_json()
-        required_fields = ["user", "type", "amount", "credit_type", "actor_role"]
-        for field in required_fields:
-            if field not in data:
-                return {"error": f"Missing field: {field}"}, 400
-        user_id = data["user"]
-        txn_type = data["type"]
-        try:
-            amount = int(data["amount"])
-        except ValueError:
-            return {"error": "Amount must be an integer"}, 400
-        credit_type = data["credit_type"]
-        actor_role = data["actor_role"].strip().lower()
-        if txn_type == "earn" and actor_role != "volunteering workplace":
-            return {"error": "Only volunteering workplace can trigger earn transactions"}, 400
-        if txn_type == "redeem" and actor_role not in ["credit based food bank", "credit based shelter"]:
-            return {"error": "Only credit based food banks or shelters can trigger redeem transactions"}, 400
-        success, result_val = update_user_credits(user_id, amount, txn_type, credit_type)
+        error = validate_transaction(data)
+        if error:
+            return {"error": error}, 400
+        entry = transaction_entry(data)
+        success, result_val = record_transaction(entry)
         if not success:
             return {"error": result_val}, 400
-        result = transactions_collection.insert_one(data)
-        new_txn = transactions_collection.find_one({"_id": result.inserted_id})
-        return serialize_doc(new_txn), 201
+        # The NGO owning this person is not known here, so every dashboard is refreshed.
+        view_versions.bump("credits")
+        return serialize_doc(entry), 201
+
+class TransactionBulk(Resource):
+    def post(self):
+        if request.mimetype == "application/x-ndjson":
+            items = parse_ndjson(request.stream)
+        else:
+            items = request.get_json(silent=True)
+            if not isinstance(items, list):
+                return {"error": "Expected a JSON array or NDJSON body"}, 400
+        results = []
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= TRANSACTIONS_BULK_CHUNK_SIZE:
+                results.extend(apply_transaction_batch(chunk, offset=len(results)))
+                chunk = []
+        if chunk:
+            results.extend(apply_transaction_batch(chunk, offset=len(results)))
+        inserted = sum(1 for r in results if r["status"] == 201)
+        if inserted:
+            view_versions.bump("credits")
+        return {"inserted": inserted, "failed": len(results) - inserted, "results": results}
 
 class Transaction(Resource):
     def get(self, txn_id):
@@ -524,22 +3072,41 @@ class Transaction(Resource):
             return serialize_doc(txn)
         return {"error": "Transaction not found"}, 404
 
+    # The ledger is append-only: balances are rebuilt from it, so corrections
+    # are recorded as new (reversing) transactions rather than edits.
     def put(self, txn_id):
-        data = request.get_json()
-        result = transactions_collection.update_one({"_id": ObjectId(txn_id)}, {"$set": data})
-        if result.matched_count == 0:
-            return {"error": "Transaction not found"}, 404
-        txn = transactions_collection.find_one({"_id": ObjectId(txn_id)})
-        return serialize_doc(txn)
+        return {"error": "Transactions are append-only; post a reversing transaction instead"}, 405
 
     def delete(self, txn_id):
-        result = transactions_collection.delete_one({"_id": ObjectId(txn_id)})
-        if result.deleted_count == 0:
-            return {"error": "Transaction not found"}, 404
-        return {"message": "Transaction deleted successfully"}
+        return {"error": "Transactions are append-only; post a reversing transaction instead"}, 405
 
 api.add_resource(TransactionList, '/api/transactions')
+api.add_resource(TransactionBulk, '/api/transactions/bulk')
 api.add_resource(Transaction, '/api/transactions/<string:txn_id>')
+api.add_resource(OpportunitySearch, '/api/opportunities')
+api.add_resource(AnalyticsReport, '/api/analytics/<string:scope>/<string:scope_id>')
+
+def create_app():
+    """Return the configured app for a WSGI server, e.g.
+
+        gunicorn --preload -w 4 --threads 16 "app:create_app()"
+
+    Building the app does no I/O: MongoDB and Gemini clients are created per
+    process on first use and background jobs start with each worker's first
+    request, so preloading in the master is safe. Run `flask bootstrap` once
+    per deployment for collections, seed data and indexes, or set
+    BOOTSTRAP_ON_START for single-process development.
+
+    Use a threaded (--threads) or gevent worker class: each open live
+    dashboard stream holds a request thread for up to LIVE_STREAM_SECONDS,
+    and each chat request one for up to GEMINI_TIMEOUT, and plain sync
+    workers would serve nothing else meanwhile. LIVE_MAX_SUBSCRIBERS plus
+    GEMINI_MAX_CONCURRENCY + GEMINI_MAX_QUEUE must stay below --threads."""
+    if app.config['BOOTSTRAP_ON_START']:
+        for coll, keys, error in bootstrap():
+            print(f"Could not create index {keys} on {coll}: {error}")
+    return app
 
 if __name__ == '__main__':
-    app.run(debug=app.config['DEBUG'], use_reloader=False)
+    app.config['BOOTSTRAP_ON_START'] = True
+    create_app().run(debug=app.config['DEBUG'], use_reloader=False)
@@ -0,0 +1,182 @@
+"""Fingerprinted, precompressed static assets.
+
+`flask build-assets` copies static/ into static/dist/. It minifies CSS and SVG
+(and JS when rjsmin is installed) and adds a content hash to every file name.
+It writes .gz (and .br when the brotli package is installed) next to each text
+asset. A manifest maps each original path to its built name.
+
+Templates call asset_url('css/style.css'). Once a manifest exists that
+resolves to /assets/css/style.<hash>.css, served with the best encoding the
+client accepts and a one-year immutable Cache-Control. A file's name changes
+whenever its content does. Without a build, asset_url falls back to the
+plain static URL.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import abort, request, send_file, url_for
+
+DIST_DIRNAME = "dist"
+MANIFEST_NAME = "manifest.json"
+TEXT_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+CSS_URL = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+
+
+def minify_css(text):
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    # A space before ":" can be a descendant combinator (".menu :hover").
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}").strip()
+
+
+def minify_svg(text):
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.S)
+    return re.sub(r">\s+<", "><", text).strip()
+
+
+def minify_js(text):
+    # A regex cannot minify JavaScript safely; only use a real minifier.
+    try:
+        import rjsmin
+    except ImportError:
+        return text
+    return rjsmin.jsmin(text, keep_bang_comments=True)
+
+
+MINIFIERS = {".css": minify_css, ".svg": minify_svg, ".js": minify_js}
+
+
+def fingerprint(rel_path, data):
+    root, ext = posixpath.splitext(rel_path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def rewrite_css_urls(text, rel_path, manifest):
+    """Point url(...) references at the fingerprinted files, keeping them relative."""
+    base = posixpath.dirname(rel_path)
+
+    def replace(match):
+        target = match.group(2)
+        if re.match(r"^(data:|https?:|//|#)", target):
+            return match.group(0)
+        resolved = posixpath.normpath(posixpath.join(base, target))
+        built = manifest.get(resolved)
+        if not built:
+            return match.group(0)
+        return f"url({posixpath.relpath(built, base)})"
+    return CSS_URL.sub(replace, text)
+
+
+def write_compressed(path, data):
+    with gzip.open(path + ".gz", "wb", compresslevel=9) as f:
+        f.write(data)
+    try:
+        import brotli
+    except ImportError:
+        return
+    with open(path + ".br", "wb") as f:
+        f.write(brotli.compress(data, quality=11))
+
+
+def build(static_dir, dist_dir=None):
+    """Build every file under static_dir into dist_dir and return the manifest."""
+    dist_dir = dist_dir or os.path.join(static_dir, DIST_DIRNAME)
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != dist_dir]
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            sources.append((os.path.relpath(path, static_dir).replace(os.sep, "/"), path))
+    # Stylesheets go last so their url(...) references can use the built names.
+    sources.sort(key=lambda item: (item[0].endswith(".css"), item[0]))
+
+    manifest = {}
+    for rel_path, path in sources:
+        ext = posixpath.splitext(rel_path)[1].lower()
+        with open(path, "rb") as f:
+            data = f.read()
+        if ext in MINIFIERS:
+            text = data.decode("utf-8")
+            if ext == ".css":
+                text = rewrite_css_urls(text, rel_path, manifest)
+            data = MINIFIERS[ext](text).encode("utf-8")
+        built = fingerprint(rel_path, data)
+        out_path = os.path.join(dist_dir, built)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, "wb") as f:
+            f.write(data)
+        if ext in TEXT_EXTENSIONS:
+            write_compressed(out_path, data)
+        manifest[rel_path] = built
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(dist_dir):
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_app(app):
+    """Register the /assets route and the asset_url template helper."""
+    dist_dir = os.path.join(app.static_folder, DIST_DIRNAME)
+    state = {"manifest": load_manifest(dist_dir)}
+    built_names = {}
+
+    def refresh():
+        state["manifest"] = load_manifest(dist_dir)
+        built_names.clear()
+        built_names.update((v, k) for k, v in state["manifest"].items())
+    refresh()
+
+    def asset_url(filename):
+        filename = filename.lstrip("/")
+        built = state["manifest"].get(filename)
+        if built:
+            return url_for("hashed_asset", filename=built)
+        return url_for("static", filename=filename)
+
+    @app.route('/assets/<path:filename>')
+    def hashed_asset(filename):
+        if filename not in built_names:
+            abort(404)
+        path = os.path.join(dist_dir, filename)
+        accepted = request.accept_encodings
+        encoding = None
+        for candidate, suffix in [("br", ".br"), ("gzip", ".gz")]:
+            if accepted[candidate] and os.path.exists(path + suffix):
+                encoding, path = candidate, path + suffix
+                break
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = send_file(path, mimetype=mimetype, conditional=True, max_age=31536000)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+    app.jinja_env.globals.update(asset_url=asset_url)
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        manifest = build(app.static_folder, dist_dir)
+        refresh()
+        print(f"Built {len(manifest)} assets into {dist_dir}.")
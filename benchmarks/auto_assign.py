@@ -0,0 +1,72 @@
+"""Auto-assignment planning and apply time.
+
+    python benchmarks/auto_assign.py --people 3000 --events 1000 [--mock]
+
+Seeds one NGO with --people unassigned homeless persons and --events open
+events with mixed credit offers. It then times the preview (two reads plus
+planning) and the apply (a fixed number of bulk writes) for both strategies.
+Apply runs only for the last strategy, because it consumes the positions.
+Planning only uses the benchmark organization's events, so real events are
+never claimed, and everything seeded is deleted afterwards. mongomock evaluates every update by scanning the collection, so its apply
+times say nothing about a real server.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from common import load_app
+
+
+def seed(app, people, events, rng):
+    ngo_id = str(app.users_collection.insert_one({"name": "Benchmark NGO", "role": "ngo"}).inserted_id)
+    org_id = str(app.ObjectId())
+    app.users_collection.insert_many([{
+        "name": f"Benchmark Person {i}", "role": "homeless person", "added_by": ngo_id,
+        "shelter_credits": rng.randrange(50), "food_credits": rng.randrange(50)
+    } for i in range(people)])
+    app.events_collection.insert_many([
+        app.new_event_doc(org_id, "Benchmark Org", f"Shift {k}", rng.randrange(1, 6),
+                          rng.randrange(11), rng.randrange(11))
+        for k in range(events)
+    ])
+    return ngo_id, org_id
+
+
+def cleanup(app, ngo_id, org_id):
+    app.users_collection.delete_many({"added_by": ngo_id})
+    app.users_collection.delete_one({"_id": app.ObjectId(ngo_id)})
+    app.events_collection.delete_many({"org_id": org_id})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--people", type=int, default=3000)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mock", action="store_true", help="use an in-process mongomock database")
+    parser.add_argument("--force", action="store_true", help="allow a database whose name lacks bench/test")
+    args = parser.parse_args(argv)
+
+    app = load_app(use_mock=args.mock, force=args.force)
+    ngo_id, org_id = seed(app, args.people, args.events, random.Random(args.seed))
+    try:
+        results = {}
+        for strategy in app.ASSIGNMENT_STRATEGIES:
+            start = time.perf_counter()
+            plan = app.preview_assignments(ngo_id, strategy, org_id=org_id)
+            results[f"preview_{strategy}_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            results[f"planned_{strategy}"] = len(plan)
+        start = time.perf_counter()
+        applied = app.apply_assignments(plan)
+        results["apply_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        results["applied"] = len(applied)
+        print(json.dumps(results, indent=2))
+    finally:
+        cleanup(app, ngo_id, org_id)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Worker cold start: import time, first request time and resident memory.
+
+    python benchmarks/cold_start.py --runs 5 [--mock] [--output after.json]
+    python benchmarks/cold_start.py ... --compare before.json
+
+Each run starts a fresh interpreter, the way a prefork server starts a worker
+without --preload. It times importing the app and building it with
+create_app(), then the first request (the landing page plus a page that
+reads MongoDB), and reports the peak RSS after that request. Check out an
+older commit and run with --output to get the "before" numbers to compare
+against.
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from common import summarize
+
+
+def child(args):
+    start = time.perf_counter()
+    from common import load_app
+    module = load_app(use_mock=args.mock, bootstrap=False)
+    application = module.create_app() if hasattr(module, "create_app") else module.app
+    import_ms = (time.perf_counter() - start) * 1000
+    client = application.test_client()
+    start = time.perf_counter()
+    client.get("/")
+    with client.session_transaction() as sess:
+        sess["user_id"] = "0" * 24
+        sess["role"] = "user"
+    client.get("/web/user/ngos")
+    first_request_ms = (time.perf_counter() - start) * 1000
+    # ru_maxrss is in kilobytes on Linux.
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"import_ms": import_ms, "first_request_ms": first_request_ms, "rss_mb": rss_mb}))
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"{'measure':<20}{'before':>12}{'after':>12}{'change':>10}")
+    for key, now in sorted(results.items()):
+        before = baseline.get(key)
+        if not before:
+            continue
+        change = (now["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+        print(f"{key:<20}{before['p50_ms']:>12.1f}{now['p50_ms']:>12.1f}{change:>9.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mock", action="store_true", help="use an in-process mongomock database")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="print changes against an earlier results file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child(args)
+        return 0
+
+    runs = {"import_ms": [], "first_request_ms": [], "rss_mb": []}
+    command = [sys.executable, __file__, "--child"] + (["--mock"] if args.mock else [])
+    for _ in range(args.runs):
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        for key in runs:
+            runs[key].append(sample[key])
+    # summarize() labels everything in ms; rss_mb values are megabytes.
+    results = {key: summarize(values) for key, values in runs.items()}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks import the app the same way the server does, so they run against
+MONGO_URI. Pass use_mock=True to run against an in-process mongomock
+database instead (pip install mongomock); numbers from the mock are only
+meaningful relative to each other. load_app() also runs the app's one-time
+bootstrap (collections, sample providers, indexes) unless bootstrap=False.
+
+Benchmarks seed and delete data, and MONGO_URI falls back to config.env,
+so load_app() refuses any database whose name lacks "bench" or "test"
+unless force=True. The check runs before anything touches the database.
+"""
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def database_name(uri):
+    """The database named in a MongoDB URI, without resolving any hosts."""
+    path = uri.split("://", 1)[-1].split("?", 1)[0]
+    return path.split("/", 1)[1] if "/" in path else ""
+
+
+def load_app(use_mock=False, fake_gemini=True, bootstrap=True, force=False):
+    if fake_gemini:
+        os.environ.setdefault("GEMINI_CLIENT", "fake")
+        os.environ.setdefault("GEMINI_FAKE_TOKEN_DELAY", "0")
+    if use_mock:
+        os.environ["MONGO_URI"] = "mongodb://localhost:27017/EarnAndEatBench"
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import app
+    name = database_name(app.app.config["MONGO_URI"])
+    if not force and not any(word in name.lower() for word in ["bench", "test"]):
+        raise SystemExit(f"Refusing to use database '{name}'; point MONGO_URI at a bench or test database or pass --force.")
+    if bootstrap:
+        for coll, keys, error in app.bootstrap():
+            print(f"Could not create index {keys} on {coll}: {error}")
+    return app
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times and return the per-run durations in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(durations):
+    return {
+        "runs": len(durations),
+        "mean_ms": round(statistics.mean(durations), 3),
+        "p50_ms": round(percentile(durations, 50), 3),
+        "p95_ms": round(percentile(durations, 95), 3),
+        "p99_ms": round(percentile(durations, 99), 3),
+    }
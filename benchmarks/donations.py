@@ -0,0 +1,101 @@
+"""Sustained donation load against a single NGO.
+
+    python benchmarks/donations.py --threads 16 --seconds 10 [--mock]
+
+Drives POST /web/user/donate_ngo from several threads for a fixed time, then
+folds the recorded donations and checks that amount_raised matches what was
+donated. --legacy also compares the two write paths directly: the previous
+one $inc on the NGO document per donation, and one donation record insert.
+The benchmark NGO and its donations are deleted afterwards.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+from common import load_app
+
+
+def donate_via_route(app, ngo_id):
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = "benchmark-donor"
+        sess["role"] = "user"
+
+    def donate():
+        response = client.post("/web/user/donate_ngo", data={"ngo_id": ngo_id, "donation": "1"})
+        assert response.status_code == 302, response.data
+    return donate
+
+
+def donate_record(app, ngo_id):
+    def donate():
+        app.donations_collection.insert_one({"ngo_id": ngo_id, "amount": 1, "donor_id": "benchmark-donor"})
+    return donate
+
+
+def donate_legacy(app, ngo_id):
+    def donate():
+        app.users_collection.update_one(
+            {"_id": app.ObjectId(ngo_id), "role": "ngo"},
+            {"$inc": {"amount_raised": 1}}
+        )
+    return donate
+
+
+def run_load(make_donate, threads, seconds):
+    counts = [0] * threads
+    deadline = time.monotonic() + seconds
+
+    def worker(slot):
+        donate = make_donate()
+        while time.monotonic() < deadline:
+            donate()
+            counts[slot] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    total = sum(counts)
+    return {"donations": total, "per_second": round(total / seconds, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--legacy", action="store_true", help="also time one $inc per donation")
+    parser.add_argument("--mock", action="store_true", help="use an in-process mongomock database")
+    parser.add_argument("--force", action="store_true", help="allow a database whose name lacks bench/test")
+    args = parser.parse_args(argv)
+
+    app = load_app(use_mock=args.mock, force=args.force)
+    app.app.config["DONATION_FOLD_LAG"] = 0
+    ngo_id = str(app.users_collection.insert_one({
+        "name": "Benchmark NGO", "email": "bench-donations@example.invalid",
+        "role": "ngo", "amount_raised": 0
+    }).inserted_id)
+    try:
+        results = {"threads": args.threads, "seconds": args.seconds}
+        results["route"] = run_load(lambda: donate_via_route(app, ngo_id), args.threads, args.seconds)
+        time.sleep(1.1)  # let the newest donations age past the fold cutoff
+        start = time.perf_counter()
+        app.fold_donations()
+        results["route"]["fold_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        folded = app.users_collection.find_one({"_id": app.ObjectId(ngo_id)})["amount_raised"]
+        results["route"]["totals_match"] = folded == results["route"]["donations"]
+        if args.legacy:
+            results["record_insert"] = run_load(lambda: donate_record(app, ngo_id), args.threads, args.seconds)
+            results["legacy_inc"] = run_load(lambda: donate_legacy(app, ngo_id), args.threads, args.seconds)
+        print(json.dumps(results, indent=2))
+        return 0 if results["route"]["totals_match"] else 1
+    finally:
+        app.donations_collection.delete_many({"ngo_id": ngo_id})
+        app.users_collection.delete_one({"_id": app.ObjectId(ngo_id)})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Bulk homeless import throughput and memory.
+
+    python benchmarks/homeless_import.py --rows 100000 [--mock]
+
+Writes a CSV with the given number of rows to a temporary file. Every 50th row
+repeats an earlier email and every 100th row has an invalid credit value. It
+imports the file through the same path the upload route uses and reports rows
+per second and peak Python memory. Peak memory should stay roughly the same as
+--rows grows. mongomock checks the unique email index by scanning the
+collection, so keep --mock runs to a few thousand rows. Imported people are
+tagged with the run and deleted afterwards, along with their opening ledger
+entries.
+"""
+import argparse
+import csv
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from common import load_app
+
+
+def write_csv(path, rows, run_id):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Email", "Shelter Credits", "Food Credits"])
+        for i in range(rows):
+            email_id = i - 1 if i and i % 50 == 0 else i
+            credits = "lots" if i % 100 == 99 else str(i % 5)
+            writer.writerow([f"Import Person {i}", f"import-{run_id}-{email_id}@example.invalid", credits, "2"])
+
+
+def cleanup(app, added_by, batch_size=10_000):
+    cursor = app.users_collection.find({"added_by": added_by}, {"_id": 1}).batch_size(batch_size)
+    user_ids = [str(u["_id"]) for u in cursor]
+    for start in range(0, len(user_ids), batch_size):
+        app.transactions_collection.delete_many({"user": {"$in": user_ids[start:start + batch_size]}})
+    app.users_collection.delete_many({"added_by": added_by})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--mock", action="store_true", help="use an in-process mongomock database")
+    parser.add_argument("--force", action="store_true", help="allow a database whose name lacks bench/test")
+    args = parser.parse_args(argv)
+
+    app = load_app(use_mock=args.mock, force=args.force)
+    run_id = int(time.time())
+    added_by = f"benchmark-ngo-{run_id}"
+    try:
+        with tempfile.NamedTemporaryFile(suffix=".csv") as tmp:
+            write_csv(tmp.name, args.rows, run_id)
+            with open(tmp.name, "rb") as f:
+                tracemalloc.start()
+                start = time.perf_counter()
+                report = app.import_homeless_rows(app.iter_csv_rows(f), added_by,
+                                                  batch_size=args.batch_size or app.IMPORT_BATCH_SIZE)
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+    finally:
+        cleanup(app, added_by)
+
+    result = report.to_dict()
+    print(json.dumps({
+        "rows": result["rows"],
+        "inserted": result["inserted"],
+        "failed": result["failed"],
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(result["rows"] / elapsed, 1),
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
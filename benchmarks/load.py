@@ -0,0 +1,300 @@
+"""Mixed-workload load test for every route.
+
+    MONGO_URI=mongodb://localhost:27017/EarnAndEatBench \
+        python benchmarks/load.py --seconds 30 --threads 8 --output results.json
+    python benchmarks/load.py --mock --seconds 5 --transactions 10000
+    python benchmarks/load.py ... --compare previous-results.json
+
+Runs the app in-process with the fake Gemini client. It seeds NGOs, homeless
+persons, organizations with events, users and transactions, then drives a
+weighted mix of requests from several threads. It reports throughput and
+p50/p95/p99 per operation. The seed data is written into the configured
+database, so the database name must contain "bench" or "test" (or pass
+--force). --drop clears it first.
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from common import ROOT, load_app, summarize
+
+DEFAULT_MIX = {
+    "sign_in": 2,
+    "ngo_dashboard": 6,
+    "assign_org_page": 2,
+    "assign_org": 1,
+    "mark_event_done": 1,
+    "redeem_page": 1,
+    "redeem": 3,
+    "list_ngos": 6,
+    "donate": 4,
+    "org_dashboard": 2,
+    "transactions_page": 3,
+    "transactions_post": 3,
+    "chat": 1,
+}
+
+PASSWORD = "bench-password"
+
+
+class Dataset:
+    def __init__(self):
+        self.ngos = []
+        self.homeless = {}
+        self.orgs = []
+        self.events = []
+        self.users = []
+
+
+def seed(app, args):
+    data = Dataset()
+    ngo_docs = [{
+        "name": f"Bench NGO {i}", "email": f"bench-ngo-{i}@example.invalid", "password": PASSWORD,
+        "role": "ngo", "cause": "load testing", "amount_raised": 0
+    } for i in range(args.ngos)]
+    data.ngos = [str(_id) for _id in app.users_collection.insert_many(ngo_docs).inserted_ids]
+    for ngo_id in data.ngos:
+        docs = [{
+            "name": f"Bench Person {ngo_id[-6:]}-{j}", "email": f"bench-{ngo_id}-{j}@example.invalid",
+            "role": "homeless person", "added_by": ngo_id,
+            "shelter_credits": 1_000_000, "food_credits": 1_000_000
+        } for j in range(args.homeless_per_ngo)]
+        data.homeless[ngo_id] = [str(_id) for _id in app.users_collection.insert_many(docs).inserted_ids] if docs else []
+    org_docs = [{
+        "org_name": f"Bench Org {i}", "email": f"bench-org-{i}@example.invalid", "password": PASSWORD
+    } for i in range(args.orgs)]
+    data.orgs = [str(_id) for _id in app.organizations_collection.insert_many(org_docs).inserted_ids] if org_docs else []
+    event_docs = [
+        app.new_event_doc(org_id, f"Bench Org {i}", f"Shift {k}", 1_000_000, 2, 3)
+        for i, org_id in enumerate(data.orgs) for k in range(args.events_per_org)
+    ]
+    data.events = [str(_id) for _id in app.events_collection.insert_many(event_docs).inserted_ids] if event_docs else []
+    data.users = [str(_id) for _id in app.users_collection.insert_many([{
+        "name": f"Bench Donor {i}", "email": f"bench-donor-{i}@example.invalid", "password": PASSWORD, "role": "user"
+    } for i in range(max(1, args.threads))]).inserted_ids]
+    everyone = [h for people in data.homeless.values() for h in people]
+    batch = []
+    for i in range(args.transactions if everyone else 0):
+        batch.append({
+            "user": everyone[i % len(everyone)], "type": "earn", "amount": 1, "credit_type": "food",
+            "actor_role": "volunteering workplace", "created_at": datetime.now(timezone.utc)
+        })
+        if len(batch) >= 10_000:
+            app.transactions_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        app.transactions_collection.insert_many(batch, ordered=False)
+    app.provider_catalog.invalidate()
+    return data
+
+
+class Worker:
+    """One simulated client: an NGO session, an org session and a donor session."""
+
+    def __init__(self, app, data, rng):
+        self.app = app
+        self.data = data
+        self.rng = rng
+        self.ngo_id = rng.choice(data.ngos)
+        self.ngo = self._client(self.ngo_id, "ngo")
+        self.org_id = rng.choice(data.orgs) if data.orgs else None
+        self.org = self._client(self.org_id, "organization") if self.org_id else None
+        self.user = self._client(rng.choice(data.users), "user")
+        self.anonymous = app.app.test_client()
+        self.providers = [p._id for p in app.provider_catalog.all()]
+
+    def _client(self, user_id, role):
+        client = self.app.app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = user_id
+            sess["role"] = role
+        return client
+
+    def person(self):
+        return self.rng.choice(self.data.homeless[self.ngo_id])
+
+    def sign_in(self):
+        i = self.rng.randrange(len(self.data.ngos))
+        return self.anonymous.post("/sign_in", data={"email": f"bench-ngo-{i}@example.invalid", "password": PASSWORD})
+
+    def ngo_dashboard(self):
+        return self.ngo.get("/web/ngo/dashboard")
+
+    def assign_org_page(self):
+        return self.ngo.get("/web/ngo/assign_org")
+
+    def assign_org(self):
+        return self.ngo.post("/web/ngo/assign_org", data={
+            "homeless_id": self.person(), "selected_event": self.rng.choice(self.data.events)
+        })
+
+    def mark_event_done(self):
+        return self.ngo.post("/web/ngo/mark_event_done", data={"homeless_id": self.person()})
+
+    def redeem_page(self):
+        return self.ngo.get("/web/homeless/redeem")
+
+    def redeem(self):
+        return self.ngo.post("/web/homeless/redeem", data={
+            "provider_id": self.rng.choice(self.providers), "homeless_id": self.person(), "amount": "1"
+        })
+
+    def list_ngos(self):
+        return self.user.get("/web/user/ngos")
+
+    def donate(self):
+        return self.user.post("/web/user/donate_ngo", data={"ngo_id": self.rng.choice(self.data.ngos), "donation": "1"})
+
+    def org_dashboard(self):
+        return self.org.get("/org/manage")
+
+    def transactions_page(self):
+        return self.anonymous.get(f"/api/transactions?limit=100&user={self.person()}")
+
+    def transactions_post(self):
+        return self.anonymous.post("/api/transactions", json={
+            "user": self.person(), "type": "earn", "amount": 1, "credit_type": "food",
+            "actor_role": "volunteering workplace"
+        })
+
+    def chat(self):
+        question = self.rng.choice(["How do I redeem credits?", "What NGOs are there?", "How do I earn credits?"])
+        return self.anonymous.post("/web/gemini/chat", json={"prompt": question})
+
+
+def run_workload(app, data, args, mix):
+    ops = list(mix)
+    weights = [mix[op] for op in ops]
+    samples = {op: [] for op in ops}
+    errors = {op: 0 for op in ops}
+    rejected = {op: 0 for op in ops}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+
+    def work(seed_value):
+        rng = random.Random(seed_value)
+        worker = Worker(app, data, rng)
+        local = {op: [] for op in ops}
+        local_errors = {op: 0 for op in ops}
+        local_rejected = {op: 0 for op in ops}
+        while time.monotonic() < deadline:
+            op = rng.choices(ops, weights)[0]
+            start = time.perf_counter()
+            response = getattr(worker, op)()
+            local[op].append((time.perf_counter() - start) * 1000)
+            # 4xx is an expected business outcome (a slot already taken, an
+            # unassigned person); 5xx is a failure.
+            if response.status_code >= 500:
+                local_errors[op] += 1
+            elif response.status_code >= 400:
+                local_rejected[op] += 1
+        with lock:
+            for op in ops:
+                samples[op].extend(local[op])
+                errors[op] += local_errors[op]
+                rejected[op] += local_rejected[op]
+
+    threads = [threading.Thread(target=work, args=(args.seed + i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for op in ops:
+        if samples[op]:
+            routes[op] = dict(summarize(samples[op]), errors=errors[op], rejected=rejected[op],
+                              throughput_rps=round(len(samples[op]) / elapsed, 1))
+    total = sum(len(s) for s in samples.values())
+    return {"elapsed_s": round(elapsed, 2), "requests": total, "throughput_rps": round(total / elapsed, 1), "routes": routes}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"{'operation':<20}{'p95 before':>12}{'p95 after':>12}{'change':>10}")
+    for op, now in sorted(results["routes"].items()):
+        before = baseline.get("routes", {}).get(op)
+        if not before:
+            continue
+        change = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        print(f"{op:<20}{before['p95_ms']:>12.2f}{now['p95_ms']:>12.2f}{change:>9.1f}%")
+
+
+def parse_mix(value):
+    mix = dict(DEFAULT_MIX)
+    if value:
+        mix = {}
+        for part in value.split(","):
+            op, _, weight = part.partition("=")
+            mix[op.strip()] = float(weight or 1)
+    unknown = [op for op in mix if op not in DEFAULT_MIX]
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(unknown)}")
+    return {op: w for op, w in mix.items() if w > 0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ngos", type=int, default=20)
+    parser.add_argument("--homeless-per-ngo", type=int, default=200)
+    parser.add_argument("--orgs", type=int, default=20)
+    parser.add_argument("--events-per-org", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--mix", help="comma-separated op=weight pairs, e.g. ngo_dashboard=5,redeem=2")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="print p95 changes against an earlier results file")
+    parser.add_argument("--mock", action="store_true", help="use an in-process mongomock database")
+    parser.add_argument("--drop", action="store_true", help="drop every collection in the database first")
+    parser.add_argument("--force", action="store_true", help="allow a database whose name lacks bench/test")
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+
+    app = load_app(use_mock=args.mock, force=args.force)
+    app.app.config["DONATION_FOLD_LAG"] = 0
+    if args.drop:
+        for name in app.db.list_collection_names():
+            app.db[name].delete_many({})
+        app.bootstrap()
+
+    seed_start = time.perf_counter()
+    data = seed(app, args)
+    seed_seconds = round(time.perf_counter() - seed_start, 2)
+
+    results = run_workload(app, data, args, mix)
+    results["meta"] = {
+        "git_commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "database": "mongomock" if args.mock else app.db.name,
+        "seed_seconds": seed_seconds,
+        "args": {k: v for k, v in vars(args).items() if k not in ["output", "compare"]},
+        "mix": mix,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
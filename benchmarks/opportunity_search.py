@@ -0,0 +1,108 @@
+"""Opportunity search latency at scale.
+
+    MONGO_URI=mongodb://localhost:27017/EarnAndEatBench \
+        python benchmarks/opportunity_search.py --opportunities 100000
+    python benchmarks/opportunity_search.py --mock --opportunities 20000
+
+Seeds --opportunities documents with generated titles, descriptions,
+locations, credit types and dates. It then times one page of each query
+shape without the result cache: browsing, filters, a deep keyset page, and
+text searches for common and rare words. Finally it times a cached hit.
+mongomock has no text search, so --mock skips the text queries. Its browse
+times reflect Python-side scans, not the indexes. The seed data goes into
+the configured database, so its name must contain "bench" or "test" (or
+pass --force); --drop clears the collection first.
+"""
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+
+from common import load_app, summarize, timed
+
+WORDS = ["kitchen", "garden", "shelter", "cleanup", "sorting", "delivery", "pantry", "laundry", "mural",
+         "tutoring", "repair", "packing", "warehouse", "reception", "cooking", "painting", "moving", "library"]
+RARE_WORDS = ["beekeeping", "bookbinding", "upholstery"]
+LOCATIONS = ["Ottawa", "Gatineau", "Kanata", "Orleans", "Nepean", "Barrhaven", "Vanier", "Westboro"]
+
+
+def seed(app, count, rng):
+    start = datetime(2026, 1, 1)
+    batch = []
+    for i in range(count):
+        words = rng.sample(WORDS, 3)
+        if rng.random() < 0.001:
+            words.append(rng.choice(RARE_WORDS))
+        location = rng.choice(LOCATIONS)
+        batch.append({
+            "title": f"{words[0].capitalize()} {words[1]} shift {i}",
+            "description": " ".join(words + rng.sample(WORDS, 4)),
+            "date": start + timedelta(days=rng.randrange(365)),
+            "location": location,
+            "location_key": location.lower(),
+            "credit_type": rng.choice(["shelter", "food", ""]),
+        })
+        if len(batch) >= 10_000:
+            app.opportunities_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        app.opportunities_collection.insert_many(batch, ordered=False)
+
+
+def filters(**values):
+    base = {"q": "", "location": "", "credit_type": "", "from": "", "after": ""}
+    base.update(values)
+    return base
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--opportunities", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mock", action="store_true", help="use an in-process mongomock database")
+    parser.add_argument("--drop", action="store_true", help="delete every opportunity first")
+    parser.add_argument("--force", action="store_true", help="allow a database whose name lacks bench/test")
+    args = parser.parse_args(argv)
+
+    app = load_app(use_mock=args.mock, force=args.force)
+    if args.drop:
+        app.opportunities_collection.delete_many({})
+    seed(app, args.opportunities, random.Random(args.seed))
+
+    cases = {
+        "browse": filters(),
+        "credit_type": filters(credit_type="food"),
+        "location": filters(location="kanata"),
+        "location_credit_from": filters(location="kanata", credit_type="shelter", **{"from": "2026-06-01"}),
+    }
+    # A keyset page 50 pages deep.
+    deep = filters()
+    for _ in range(50):
+        deep["after"] = app.search_opportunities(deep)[1] or ""
+    cases["browse_page_50"] = deep
+    if not args.mock:
+        cases.update({
+            "text_common": filters(q="kitchen"),
+            "text_two_words": filters(q="garden delivery"),
+            "text_rare": filters(q="beekeeping"),
+            "text_common_credit": filters(q="kitchen", credit_type="food"),
+        })
+        deep_text = filters(q="kitchen")
+        for _ in range(10):
+            deep_text["after"] = app.search_opportunities(deep_text)[1] or ""
+        cases["text_common_page_10"] = deep_text
+
+    results = {"opportunities": app.opportunities_collection.count_documents({})}
+    for name, case in cases.items():
+        rows = len(app.search_opportunities(case)[0])
+        results[name] = dict(summarize(timed(lambda: app.search_opportunities(case), args.repeat)), rows=rows)
+    app.cached_opportunity_search(cases["browse"])
+    results["cached_hit"] = summarize(timed(lambda: app.cached_opportunity_search(cases["browse"]), args.repeat))
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
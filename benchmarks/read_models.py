@@ -0,0 +1,89 @@
+"""Compare the full-document dashboard path with the projected read models.
+
+    python benchmarks/read_models.py --records 10000 [--mock]
+
+Seeds one NGO with N homeless records (plus the bulky fields real records
+carry), then times building the NGO dashboard's template context both ways.
+"""
+import argparse
+import json
+import sys
+import tracemalloc
+
+from common import load_app, summarize, timed
+
+
+def seed(app, records):
+    ngo_id = str(app.users_collection.insert_one({
+        "name": "Benchmark NGO", "email": "bench-ngo@example.invalid", "password": "x" * 60,
+        "role": "ngo", "cause": "benchmarks", "amount_raised": 0
+    }).inserted_id)
+    docs = [{
+        "name": f"Person {i}",
+        "email": f"bench-person-{i}@example.invalid",
+        "role": "homeless person",
+        "added_by": ngo_id,
+        "shelter_credits": i % 40,
+        "food_credits": i % 25,
+        "org_assigned": "Benchmark Org",
+        "event_assigned": "Benchmark Event",
+        "org_assigned_id": "0" * 24,
+        "event_index": i % 7,
+        "event_completed": i % 2 == 0,
+        "event_credits": {"shelter": 2, "food": 3},
+        "intake_notes": "n" * 400,
+    } for i in range(records)]
+    for start in range(0, records, 1000):
+        app.users_collection.insert_many(docs[start:start + 1000])
+    return ngo_id
+
+
+def full_documents(app, ngo_id):
+    homeless = [app.serialize_doc(u) for u in app.users_collection.find({"role": "homeless person", "added_by": ngo_id})]
+    ngo = app.serialize_doc(app.users_collection.find_one({"_id": app.ObjectId(ngo_id)}))
+    return homeless, ngo
+
+
+def read_models(app, ngo_id):
+    homeless = app.HomelessRow.find(app.users_collection, {"role": "homeless person", "added_by": ngo_id})
+    ngo = app.NGOSummary.find_one(app.users_collection, {"_id": app.ObjectId(ngo_id)})
+    return homeless, ngo
+
+
+def peak_kib(fn):
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return round(peak / 1024, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--mock", action="store_true", help="use an in-process mongomock database")
+    args = parser.parse_args(argv)
+
+    app = load_app(use_mock=args.mock)
+    ngo_id = seed(app, args.records)
+    try:
+        results = {}
+        for name, fn in [("full_documents", full_documents), ("read_models", read_models)]:
+            fn(app, ngo_id)  # warm up
+            results[name] = summarize(timed(lambda: fn(app, ngo_id), args.repeat))
+            results[name]["peak_kib"] = peak_kib(lambda: fn(app, ngo_id))
+        with app.app.test_request_context():
+            for name, fn in [("full_documents", full_documents), ("read_models", read_models)]:
+                homeless, ngo = fn(app, ngo_id)
+                render = lambda: app.render_template("ngo_dashboard.html", homeless=homeless, ngo=ngo)
+                results[name]["render"] = summarize(timed(render, args.repeat))
+        print(json.dumps({"records": args.records, "results": results}, indent=2))
+    finally:
+        app.users_collection.delete_many({"added_by": ngo_id})
+        app.users_collection.delete_one({"email": "bench-ngo@example.invalid"})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Redemption latency at a busy food-bank counter.
+
+    python benchmarks/redemption.py --redemptions 2000 --threads 8 [--mock]
+
+Several NGO staff redeem food credits against one provider at once. Compares
+the previous write path (find homeless, find provider, two unguarded $inc)
+with redeem_credits(), and also times the full POST /web/homeless/redeem.
+Reports p50/p95/p99 for each. The seeded NGO, people, provider and their
+ledger entries are deleted afterwards.
+"""
+import argparse
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from common import load_app, summarize, timed
+
+
+def seed(app, people):
+    ngo_id = str(app.users_collection.insert_one({
+        "name": "Benchmark NGO", "email": "bench-redeem-ngo@example.invalid", "role": "ngo"
+    }).inserted_id)
+    homeless_ids = [str(_id) for _id in app.users_collection.insert_many([{
+        "name": f"Redeemer {i}", "role": "homeless person", "added_by": ngo_id,
+        "food_credits": 1_000_000, "shelter_credits": 0
+    } for i in range(people)]).inserted_ids]
+    provider_id = str(app.providers_collection.insert_one({
+        "provider_name": "Benchmark Food Bank", "provider_type": "food bank", "available_quota": 10_000_000
+    }).inserted_id)
+    app.provider_catalog.invalidate()
+    return ngo_id, homeless_ids, provider_id
+
+
+def legacy_redeem(app, homeless_id, provider_id):
+    homeless = app.users_collection.find_one({"_id": app.ObjectId(homeless_id)})
+    provider = app.providers_collection.find_one({"_id": app.ObjectId(provider_id)})
+    if homeless.get("food_credits", 0) >= 1 and provider:
+        app.users_collection.update_one({"_id": app.ObjectId(homeless_id)}, {"$inc": {"food_credits": -1}})
+        app.providers_collection.update_one({"_id": app.ObjectId(provider_id)}, {"$inc": {"available_quota": -1}})
+
+
+def run(fn, homeless_ids, redemptions, threads):
+    def one(i):
+        return timed(lambda: fn(homeless_ids[i % len(homeless_ids)]), 1)[0]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return summarize(list(pool.map(one, range(redemptions))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redemptions", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--people", type=int, default=200)
+    parser.add_argument("--mock", action="store_true", help="use an in-process mongomock database")
+    parser.add_argument("--force", action="store_true", help="allow a database whose name lacks bench/test")
+    args = parser.parse_args(argv)
+
+    app = load_app(use_mock=args.mock, force=args.force)
+    ngo_id, homeless_ids, provider_id = seed(app, args.people)
+    clients = {}
+
+    def route_redeem(homeless_id):
+        client = clients.get(homeless_id[-1])
+        if client is None:
+            client = clients[homeless_id[-1]] = app.app.test_client()
+            with client.session_transaction() as sess:
+                sess["user_id"] = ngo_id
+                sess["role"] = "ngo"
+        response = client.post("/web/homeless/redeem", data={
+            "provider_id": provider_id, "homeless_id": homeless_id, "amount": "1"
+        })
+        assert response.status_code == 302, response.data
+
+    try:
+        results = {
+            "threads": args.threads,
+            "legacy": run(lambda h: legacy_redeem(app, h, provider_id), homeless_ids, args.redemptions, args.threads),
+            "guarded": run(lambda h: app.redeem_credits(h, app.provider_catalog.get(provider_id), 1),
+                           homeless_ids, args.redemptions, args.threads),
+            "route": run(route_redeem, homeless_ids, args.redemptions, args.threads),
+        }
+        print(json.dumps(results, indent=2))
+    finally:
+        app.users_collection.delete_many({"added_by": ngo_id})
+        app.users_collection.delete_one({"_id": app.ObjectId(ngo_id)})
+        app.providers_collection.delete_one({"_id": app.ObjectId(provider_id)})
+        app.transactions_collection.delete_many({"user": {"$in": homeless_ids}})
+        app.provider_catalog.invalidate()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
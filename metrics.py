@@ -0,0 +1,248 @@
+"""Low-overhead request, MongoDB and LLM instrumentation.
+
+Metrics live in process memory and are exposed in the Prometheus text format
+on /metrics. Each observation is a dict lookup and a few additions under a
+lock, cheap enough to leave on in production. Under a prefork server every
+worker keeps its own counters; scrape each worker or aggregate upstream.
+"""
+import bisect
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+from flask import Response, request
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Gauge:
+    """A value read from a callback at scrape time."""
+
+    def __init__(self, name, documentation, read):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.read()}"]
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Time spent in Flask handlers.", labels=("route", "method", "status"))
+mongo_command_seconds = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command round-trip time.", labels=("command", "route"))
+mongo_command_errors = registry.counter(
+    "mongo_command_errors_total", "MongoDB commands that failed.", labels=("command", "route"))
+mongo_slow_commands = registry.counter(
+    "mongo_slow_commands_total", "MongoDB commands slower than the slow-query threshold.", labels=("command", "route"))
+mongo_commands_per_request = registry.histogram(
+    "mongo_commands_per_request", "MongoDB commands issued per HTTP request.", labels=("route",),
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 50, 100))
+llm_seconds = registry.histogram(
+    "llm_request_duration_seconds", "Time spent in model calls.", labels=("mode",))
+llm_first_token_seconds = registry.histogram(
+    "llm_first_token_seconds", "Time until a streamed model call produced its first token.")
+llm_errors = registry.counter(
+    "llm_errors_total", "Model calls that raised.", labels=("mode",))
+
+# Recent slow commands, newest last, for ad-hoc inspection.
+slow_commands = deque(maxlen=100)
+
+_request_state = threading.local()
+
+
+def current_route():
+    return getattr(_request_state, "route", None) or "background"
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """PyMongo listener timing every command and tagging it with the route
+    whose handler issued it (or "background" outside requests)."""
+
+    def __init__(self, slow_ms=100):
+        self.slow_seconds = slow_ms / 1000
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        mongo_command_errors.inc(command=event.command_name, route=current_route())
+        self._record(event)
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1_000_000
+        route = current_route()
+        mongo_command_seconds.observe(seconds, command=event.command_name, route=route)
+        if getattr(_request_state, "route", None) is not None:
+            _request_state.mongo_calls += 1
+            _request_state.mongo_seconds += seconds
+        if seconds >= self.slow_seconds:
+            mongo_slow_commands.inc(command=event.command_name, route=route)
+            slow_commands.append({
+                "command": event.command_name,
+                "database": event.database_name,
+                "route": route,
+                "ms": round(seconds * 1000, 1),
+            })
+
+
+def timed_llm_call(fn, mode="call"):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            llm_errors.inc(mode=mode)
+            raise
+        finally:
+            llm_seconds.observe(time.perf_counter() - start, mode=mode)
+    return wrapper
+
+
+def timed_llm_stream(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        first = True
+        try:
+            for item in fn(*args, **kwargs):
+                if first:
+                    llm_first_token_seconds.observe(time.perf_counter() - start)
+                    first = False
+                yield item
+        except Exception:
+            llm_errors.inc(mode="stream")
+            raise
+        finally:
+            llm_seconds.observe(time.perf_counter() - start, mode="stream")
+    return wrapper
+
+
+def init_app(app, server_timing=False):
+    """Register the request hooks and the /metrics endpoint on a Flask app."""
+
+    @app.before_request
+    def start_request_metrics():
+        _request_state.route = request.url_rule.rule if request.url_rule else "unmatched"
+        _request_state.mongo_calls = 0
+        _request_state.mongo_seconds = 0.0
+        _request_state.start = time.perf_counter()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        route = getattr(_request_state, "route", None)
+        if route is None:
+            return response
+        elapsed = time.perf_counter() - _request_state.start
+        http_request_seconds.observe(elapsed, route=route, method=request.method, status=response.status_code)
+        mongo_commands_per_request.observe(_request_state.mongo_calls, route=route)
+        if server_timing:
+            response.headers["Server-Timing"] = (
+                f"app;dur={elapsed * 1000:.1f}, "
+                f'mongo;dur={_request_state.mongo_seconds * 1000:.1f};desc="{_request_state.mongo_calls} calls"'
+            )
+        return response
+
+    @app.teardown_request
+    def clear_request_metrics(exc):
+        _request_state.route = None
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
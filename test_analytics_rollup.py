@@ -0,0 +1,64 @@
+"""Analytics rollup replay after an interrupted batch.
+
+Writes to MONGO_URI, so it only runs when that is set explicitly and names a
+test or bench database:
+
+    MONGO_URI=mongodb://localhost:27017/EarnAndEatTest python -m pytest test_analytics_rollup.py
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson.objectid import ObjectId
+
+MONGO_URI = os.environ.get("MONGO_URI", "")
+if not any(word in MONGO_URI.rsplit("/", 1)[-1].split("?")[0].lower() for word in ["bench", "test"]):
+    pytest.skip("set MONGO_URI to a test or bench database to run this test", allow_module_level=True)
+
+from app import (analytics_collection, analytics_report, app_state_collection, apply_rollup_deltas,
+                 roll_up_transactions, rollup_deltas, transactions_collection)
+
+
+def ledger_entries(org_id, count, seconds_ago):
+    timestamp = int((datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)).timestamp())
+    return [{
+        "_id": ObjectId(f"{timestamp:08x}{os.urandom(8).hex()}"),
+        "user": "0" * 24, "type": "earn", "amount": 1, "credit_type": "food",
+        "actor_role": "volunteering workplace", "org_id": org_id
+    } for _ in range(count)]
+
+
+def test_interrupted_batch_is_replayed_exactly_once():
+    org_id = str(ObjectId())
+    first = ledger_entries(org_id, 3, seconds_ago=120)
+    try:
+        roll_up_transactions()
+        state = app_state_collection.find_one({"_id": "analytics_rollup"}) or {}
+        low = state.get("rolled_up_through")
+        transactions_collection.insert_many(first)
+        high = max(txn["_id"] for txn in first)
+        # A run that recorded its batch and applied it, then died before the checkpoint.
+        app_state_collection.update_one(
+            {"_id": "analytics_rollup"}, {"$set": {"pending": {"low": low, "high": high}}}, upsert=True
+        )
+        apply_rollup_deltas(rollup_deltas(first), high)
+
+        transactions_collection.insert_many(ledger_entries(org_id, 2, seconds_ago=60))
+        roll_up_transactions()
+
+        day = high.generation_time.strftime("%Y-%m-%d")
+        since = (high.generation_time - timedelta(days=1)).strftime("%Y-%m-%d")
+        until = (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%d")
+        rows = analytics_report("org", org_id, since, until)
+        assert sum(row["earned"] for row in rows) == 5, rows
+        assert sum(row["earn_count"] for row in rows) == 5, rows
+        assert day in [row["period"] for row in rows]
+        assert "pending" not in app_state_collection.find_one({"_id": "analytics_rollup"})
+    finally:
+        transactions_collection.delete_many({"org_id": org_id})
+        analytics_collection.delete_many({"scope": "org", "scope_id": org_id})
+
+
+if __name__ == "__main__":
+    test_interrupted_batch_is_replayed_exactly_once()
+    print("OK: interrupted rollup batch replayed exactly once")
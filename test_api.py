@@ -1,42 +1,54 @@
+"""Manual smoke check for the transaction API against a running server.
+
+    python test_api.py <homeless_user_id>
+
+There is no user-listing endpoint; copy the ID of a homeless person from the
+NGO dashboard or the users collection.
+"""
+import sys
+
 import requests
 
 BASE_URL = "http://127.0.0.1:5000/api"
 
-# Step 1: Retrieve all users and pick one with role "homeless person"
-users_url = f"{BASE_URL}/users"
-response = requests.get(users_url)
-if response.status_code != 200:
-    print("Error retrieving users:", response.status_code, response.text)
-    exit(1)
-
-users = response.json()
-user_id = None
-for user in users:
-    if user.get("role", "").strip().lower() == "homeless person":
-        if user.get("name", "").strip().lower() == "test homeless":
-            user_id = user["_id"]
+
+def main(user_id):
+    print("Using user with ID:", user_id)
+
+    # Step 1: Earn 5 food credits, then redeem them again
+    create_txn_url = f"{BASE_URL}/transactions"
+    for txn_data in [
+        {"user": user_id, "type": "earn", "amount": 5, "credit_type": "food", "actor_role": "volunteering workplace"},
+        {"user": user_id, "type": "redeem", "amount": 5, "credit_type": "food", "actor_role": "credit based food bank"},
+    ]:
+        txn_response = requests.post(create_txn_url, json=txn_data)
+        if txn_response.status_code == 201:
+            print("Transaction created successfully:")
+            print(txn_response.json())
+        else:
+            print("Error creating transaction:")
+            print(txn_response.status_code, txn_response.text)
+            return 1
+
+    # Step 2: Page through the user's transactions
+    params = {"user": user_id, "limit": 100}
+    total = 0
+    while True:
+        response = requests.get(create_txn_url, params=params)
+        if response.status_code != 200:
+            print("Error listing transactions:", response.status_code, response.text)
+            return 1
+        page = response.json()
+        total += len(page["transactions"])
+        if not page["next_after"]:
             break
+        params["after"] = page["next_after"]
+    print(f"User has {total} transactions")
+    return 0
+
 
-if not user_id:
-    print("No user with role 'homeless person' found. Please create one first.")
-    exit(1)
-
-print("Using user with ID:", user_id)
-
-# Step 2: Attempt to create a transaction to redeem (spend) 20 credits
-txn_data = {
-    "user": user_id,
-    "type": "redeem",
-    "amount": 5
-}
-
-create_txn_url = f"{BASE_URL}/transactions"
-txn_response = requests.post(create_txn_url, json=txn_data)
-
-if txn_response.status_code == 201:
-    txn = txn_response.json()
-    print("Transaction created successfully:")
-    print(txn)
-else:
-    print("Error creating transaction:")
-    print(txn_response.status_code, txn_response.text)
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    sys.exit(main(sys.argv[1]))
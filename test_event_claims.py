@@ -0,0 +1,42 @@
+"""Parallel claims on one event never oversell its positions.
+
+Writes to MONGO_URI, so it only runs when that is set explicitly and names a
+test or bench database:
+
+    MONGO_URI=mongodb://localhost:27017/EarnAndEatTest python -m pytest test_event_claims.py
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from bson.objectid import ObjectId
+
+MONGO_URI = os.environ.get("MONGO_URI", "")
+if not any(word in MONGO_URI.rsplit("/", 1)[-1].split("?")[0].lower() for word in ["bench", "test"]):
+    pytest.skip("set MONGO_URI to a test or bench database to run this test", allow_module_level=True)
+
+from app import claim_event_slot, events_collection, new_event_doc
+
+POSITIONS = 5
+PARALLEL_CLAIMS = 50
+
+
+def test_parallel_claims_do_not_oversell():
+    event_id = str(events_collection.insert_one(new_event_doc(
+        "0" * 24, "Concurrency Check Org", "Concurrency Check", POSITIONS, 1, 1
+    )).inserted_id)
+    try:
+        with ThreadPoolExecutor(max_workers=PARALLEL_CLAIMS) as pool:
+            results = list(pool.map(lambda _: claim_event_slot(event_id), range(PARALLEL_CLAIMS)))
+        claimed = [r for r in results if r]
+        event = events_collection.find_one({"_id": ObjectId(event_id)})
+        assert len(claimed) == POSITIONS, f"{len(claimed)} claims succeeded for {POSITIONS} positions"
+        assert event["positions_available"] == 0
+        assert event["status"] == "full"
+    finally:
+        events_collection.delete_one({"_id": ObjectId(event_id)})
+
+
+if __name__ == "__main__":
+    test_parallel_claims_do_not_oversell()
+    print(f"OK: {PARALLEL_CLAIMS} parallel claims, {POSITIONS} positions, no overselling")
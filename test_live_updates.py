@@ -0,0 +1,90 @@
+"""Live dashboard updates against a real change stream.
+
+Change streams need a replica set; a local single-node one is enough:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017
+    mongosh --eval 'rs.initiate()'
+    MONGO_URI=mongodb://localhost:27017/EarnAndEatTest python -m pytest test_live_updates.py
+
+It writes to that database, so it is skipped unless MONGO_URI is set
+explicitly and names a test or bench database.
+"""
+import os
+import queue
+
+import pytest
+from bson.objectid import ObjectId
+
+MONGO_URI = os.environ.get("MONGO_URI", "")
+if not any(word in MONGO_URI.rsplit("/", 1)[-1].split("?")[0].lower() for word in ["bench", "test"]):
+    pytest.skip("set MONGO_URI to a test or bench database to run this test", allow_module_level=True)
+
+from app import change_feed, donations_collection, events_collection, new_event_doc, users_collection
+
+TIMEOUT = 10
+
+
+def next_delta(subscriber):
+    item = subscriber.queue.get(timeout=TIMEOUT)
+    assert item is not None, f"feed closed: {subscriber.closed}"
+    return item
+
+
+def test_deltas_reach_only_their_owner_and_resume():
+    ngo_id, other_ngo_id, org_id = str(ObjectId()), str(ObjectId()), str(ObjectId())
+    mine, _ = change_feed.subscribe(f"ngo:{ngo_id}")
+    theirs, _ = change_feed.subscribe(f"ngo:{other_ngo_id}")
+    org, _ = change_feed.subscribe(f"org:{org_id}")
+    person_id = event_id = None
+    try:
+        # Give the shared watcher time to open its stream before writing.
+        try:
+            mine.queue.get(timeout=2)
+        except queue.Empty:
+            pass
+        assert change_feed.available, "change streams are not available; is MONGO_URI a replica set?"
+
+        person_id = users_collection.insert_one({
+            "name": "Live Check", "email": f"live-{ngo_id}@example.invalid", "role": "homeless person",
+            "added_by": ngo_id, "shelter_credits": 1, "food_credits": 2
+        }).inserted_id
+        first_token, inserted = next_delta(mine)
+        assert inserted["op"] == "insert" and inserted["id"] == str(person_id)
+        assert inserted["fields"]["food_credits"] == 2 and "email" not in inserted["fields"]
+
+        users_collection.update_one({"_id": person_id}, {"$inc": {"food_credits": 3}})
+        _, updated = next_delta(mine)
+        assert updated == {"kind": "member", "op": "update", "id": str(person_id), "fields": {"food_credits": 5}}
+
+        donations_collection.insert_one({"ngo_id": ngo_id, "amount": 7.5, "donor_id": "live-check"})
+        _, donation = next_delta(mine)
+        assert donation == {"kind": "donation", "amount": 7.5}
+
+        event_id = events_collection.insert_one(new_event_doc(org_id, "Live Org", "Live Shift", 3, 1, 1)).inserted_id
+        _, event = next_delta(org)
+        assert event["kind"] == "event" and event["fields"]["positions_available"] == 3
+
+        assert theirs.queue.empty(), "another NGO received this NGO's changes"
+
+        # A browser reconnecting after the first delta gets the two it missed.
+        resumed, missed = change_feed.subscribe(f"ngo:{ngo_id}", last_event_id=first_token)
+        assert [delta for _, delta in missed] == [updated, donation]
+        change_feed.unsubscribe(resumed)
+        # A token this worker never saw (another worker's, newer than anything
+        # here) resumes from now rather than forcing a reload.
+        unknown, missed = change_feed.subscribe(f"ngo:{ngo_id}", last_event_id="F" * 40)
+        assert missed == []
+        change_feed.unsubscribe(unknown)
+    finally:
+        for subscriber in [mine, theirs, org]:
+            change_feed.unsubscribe(subscriber)
+        if person_id:
+            users_collection.delete_one({"_id": person_id})
+        if event_id:
+            events_collection.delete_one({"_id": event_id})
+        donations_collection.delete_many({"donor_id": "live-check"})
+
+
+if __name__ == "__main__":
+    test_deltas_reach_only_their_owner_and_resume()
+    print("OK: deltas routed to their owners and replayed after reconnect")